@@ -1,14 +1,17 @@
 import sys
-import os
 import numpy as np
 import cv2
-from glob import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout,
                              QWidget, QLabel, QPushButton, QFileDialog, QSlider,
                              QMessageBox, QScrollArea, QGridLayout, QGroupBox)
-from PyQt5.QtCore import Qt, pyqtSignal, QSize, QRect, QRegExp
+from PyQt5.QtCore import Qt, pyqtSignal, QSize, QRect, QRegExp, QObject
+from PyQt5 import sip
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor, QWheelEvent, QRegExpValidator
 
+from frame_cache import FrameCache, FramePrefetcher, list_image_files
+
 
 class Canvas(QWidget):
     """
@@ -19,7 +22,7 @@ class Canvas(QWidget):
     zoom_sync = pyqtSignal(float)
     mov_sync = pyqtSignal(list)
 
-    def __init__(self, title="Image Display", show_crop_rect=True):
+    def __init__(self, title="Image Display", show_crop_rect=True, cache_bytes=1024 ** 3, prefetch_num=4):
         super().__init__()
         self.title = title
         self.show_crop_rect = show_crop_rect
@@ -30,11 +33,21 @@ class Canvas(QWidget):
         self.img_current_path = None
         self.frm_idx = 0
 
+        # 帧缓存与预取
+        self.frame_cache = FrameCache(max_bytes=cache_bytes)
+        self.prefetcher = FramePrefetcher(self.frame_cache, prefetch_num=prefetch_num)
+        self.play_direction = 1
+        self.loading = False
+        self.loading_idx = 0
 
         # 图像属性
         self.original_image = None
-        self.display_image = None
-        self.pixmap = None
+        self.display_image = None  # 当前渲染区域的 BGR 数据，q_image 直接引用其内存
+        self.q_image = None
+        self.pyramid = []  # 惰性构建的图像金字塔，第 k 层为原图的 1/2^k
+        self.scaled_size = [0, 0]  # 缩放后图像的完整尺寸 [w, h]
+        self.render_rect = [0, 0, 0, 0]  # 已渲染区域（缩放后坐标系）[x0, y0, x1, y1]
+        self.render_margin = 256  # 视口外额外渲染的边距（像素）
 
         # 拖拽相关属性
         self.image_dragging = False  # 是否正在拖拽图像
@@ -54,19 +67,16 @@ class Canvas(QWidget):
     def init_img_folder(self, folder):
         self.img_folder = folder
         self.frm_idx = 0
+        self.play_direction = 1
+        self.frame_cache.clear()
 
-        self.img_files_path = glob(os.path.join(folder, "*.png"))
-        self.img_files_path += glob(os.path.join(folder, "*.jpg"))
-        self.img_files_path += glob(os.path.join(folder, "*.tiff"))
-        self.img_files_path += glob(os.path.join(folder, "*.tif"))
-        self.img_files_path.sort()
+        self.img_files_path = list_image_files(folder)
 
         self.img_current_path = self.img_files_path[self.frm_idx]
 
         if self.img_current_path:
-            original_image = cv2.imread(self.img_current_path)
-            if original_image is not None:
-                display_image = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
+            display_image = self.load_frame(self.frm_idx)
+            if display_image is not None:
                 if display_image.shape[0] < 1080 or display_image.shape[1] < 1920:
                     QMessageBox.warning(self, "Warning", "The image size is smaller than 1080x1920.")
                     self.show_crop_rect = False
@@ -74,40 +84,75 @@ class Canvas(QWidget):
                     self.show_crop_rect = True
                 self.set_image(display_image)
                 self.set_crop_rect(self.crop_rect)
+                self.prefetch_around(self.frm_idx)
         else:
             QMessageBox.critical(self, "Error", "Failed to image from: {}".format(self.img_current_path))
 
         return len(self.img_files_path)
 
+    def load_frame(self, frm_idx):
+        """读取指定帧（BGR），优先命中缓存；可在任意线程调用"""
+        return self.prefetcher.load(self.img_files_path[frm_idx])
+
+    def prefetch_around(self, frm_idx):
+        """沿浏览方向预取后续帧，并保留反方向的一帧"""
+        num = self.prefetcher.prefetch_num
+        indices = [frm_idx + self.play_direction * (i + 1) for i in range(num)]
+        indices.append(frm_idx - self.play_direction)
+        paths = [self.img_files_path[i] for i in indices if 0 <= i < len(self.img_files_path)]
+        self.prefetcher.prefetch(paths)
+
     def set_image_via_idx(self, frm_idx):
+        """同步读取并显示指定帧"""
+        display_image = self.load_frame(frm_idx) if self.img_files_path else None
+        self.show_frame(frm_idx, display_image)
+
+    def show_frame(self, frm_idx, display_image):
+        """显示已解码的帧（须在 UI 线程调用）"""
+        if frm_idx != self.frm_idx:
+            self.play_direction = 1 if frm_idx > self.frm_idx else -1
         self.frm_idx = frm_idx
-        self.img_current_path = self.img_files_path[self.frm_idx]
+        self.loading = False
+        self.img_current_path = self.img_files_path[self.frm_idx] if self.img_files_path else None
 
         if self.img_current_path:
-            original_image = cv2.imread(self.img_current_path)
-            if original_image is not None:
-                display_image = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
+            if display_image is not None:
                 if display_image.shape[0] < 1080 or display_image.shape[1] < 1920:
                     QMessageBox.warning(self, "Warning", "The image size is smaller than 1080x1920.")
                     self.show_crop_rect = False
                 else:
                     self.show_crop_rect = True
                 self.set_image(display_image)
+            self.prefetch_around(self.frm_idx)
 
         else:
             QMessageBox.critical(self, "Error", "Failed to image from: {}".format(self.img_current_path))
 
+    def set_loading(self, frm_idx):
+        """显示占位提示：保留上一帧，并标注正在加载的帧号"""
+        self.loading = True
+        self.loading_idx = frm_idx
+        self.update()
+
+    def clear_loading(self):
+        """取消占位提示，保留上一帧（加载失败时使用）"""
+        self.loading = False
+        self.update()
+
     def set_image(self, image):
         """设置图像"""
         if image is not None:
             self.original_image = image
-            self.display_image = image.copy()
+            self.pyramid = [image]
             self.update_display()
 
     def set_offset(self, offset):
         self.image_offset = offset
         if self.original_image is not None:
-            self.update()
+            if self.needs_render():
+                self.update_display()
+            else:
+                self.update()
 
     def set_zoom(self, zoom_factor):
         """设置缩放比例"""
@@ -115,27 +160,84 @@ class Canvas(QWidget):
         if self.original_image is not None:
             self.update_display()
 
+    def visible_region(self, margin=0):
+        """窗口可见区域（外扩 margin）在缩放后图像坐标系中的范围 [x0, y0, x1, y1]"""
+        scaled_w, scaled_h = self.scaled_size
+        x0 = max(0, int(-self.image_offset[0]) - margin)
+        y0 = max(0, int(-self.image_offset[1]) - margin)
+        x1 = min(scaled_w, int(-self.image_offset[0]) + self.width() + margin)
+        y1 = min(scaled_h, int(-self.image_offset[1]) + self.height() + margin)
+        return [x0, y0, x1, y1]
+
+    def visible_image_region(self, img_w, img_h, margin=0):
+        """窗口可见区域（外扩 margin 个窗口像素）在原图坐标系中的范围 [x0, y0, x1, y1]"""
+        x0 = max(0, int((-self.image_offset[0] - margin) / self.zoom_factor))
+        y0 = max(0, int((-self.image_offset[1] - margin) / self.zoom_factor))
+        x1 = min(img_w, int(np.ceil((-self.image_offset[0] + self.width() + margin) / self.zoom_factor)))
+        y1 = min(img_h, int(np.ceil((-self.image_offset[1] + self.height() + margin) / self.zoom_factor)))
+        return [x0, y0, x1, y1]
+
+    def needs_render(self):
+        """可见区域超出已渲染区域时需要重新渲染"""
+        x0, y0, x1, y1 = self.visible_region()
+        rx0, ry0, rx1, ry1 = self.render_rect
+        return x0 < rx0 or y0 < ry0 or x1 > rx1 or y1 > ry1
+
     def update_display(self):
-        """更新显示"""
+        """更新显示：只渲染可见视口（外加边距）内的缩放图像，内存与缩放比例无关"""
         if self.original_image is not None:
-            # 应用缩放
-            if self.zoom_factor != 1.0:
-                new_width = int(self.original_image.shape[1] * self.zoom_factor)
-                new_height = int(self.original_image.shape[0] * self.zoom_factor)
-                self.display_image = cv2.resize(self.original_image, (new_width, new_height))
-            else:
-                self.display_image = self.original_image.copy()
+            img_h, img_w = self.original_image.shape[:2]
+            scaled_w = int(img_w * self.zoom_factor)
+            scaled_h = int(img_h * self.zoom_factor)
+            self.scaled_size = [scaled_w, scaled_h]
+
+            x0, y0, x1, y1 = self.visible_region(self.render_margin)
+            self.render_rect = [x0, y0, x1, y1]
+            if x1 <= x0 or y1 <= y0:
+                self.display_image = None
+                self.q_image = QImage()
+                self.update()
+                return
 
-            # 转换为 QPixmap
+            if self.zoom_factor == 1.0:
+                # 直接引用原图的子区域，不复制
+                self.display_image = self.original_image[y0:y1, x0:x1]
+            else:
+                # 从最接近的金字塔层直接采样可见区域，层间缩放比例不超过 2 倍，线性插值即可
+                level_image = self.get_pyramid_level(self.zoom_factor)
+                fx = level_image.shape[1] / scaled_w
+                fy = level_image.shape[0] / scaled_h
+                mtx = np.array([[fx, 0, (x0 + 0.5) * fx - 0.5],
+                                [0, fy, (y0 + 0.5) * fy - 0.5]])
+                self.display_image = cv2.warpAffine(level_image, mtx, (x1 - x0, y1 - y0),
+                                                    flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                                    borderMode=cv2.BORDER_REPLICATE)
+
+            # 零拷贝包装为 QImage：直接使用 BGR 内存与行跨度，display_image 保证缓冲区存活
             height, width = self.display_image.shape[:2]
-            bytes_per_line = 3 * width
+            bytes_per_line = self.display_image.strides[0]
 
-            q_img = QImage(self.display_image.data, width, height, bytes_per_line, QImage.Format_RGB888)
-            self.pixmap = QPixmap.fromImage(q_img)
+            self.q_image = QImage(sip.voidptr(self.display_image.ctypes.data), width, height,
+                                  bytes_per_line, QImage.Format_BGR888)
 
             # 更新显示
             self.update()
 
+    def get_pyramid_level(self, zoom_factor):
+        """返回不小于目标缩放比例的最小金字塔层（按需逐层构建）"""
+        level = 0
+        while 2.0 ** -(level + 1) >= zoom_factor:
+            level += 1
+
+        while len(self.pyramid) <= level:
+            prev = self.pyramid[-1]
+            if min(prev.shape[:2]) < 64:
+                break
+            half_size = (max(1, prev.shape[1] // 2), max(1, prev.shape[0] // 2))
+            self.pyramid.append(cv2.resize(prev, half_size, interpolation=cv2.INTER_AREA))
+
+        return self.pyramid[min(level, len(self.pyramid) - 1)]
+
     def set_crop_rect(self, rect):
         """设置裁剪区域"""
         self.crop_rect = rect
@@ -143,8 +245,8 @@ class Canvas(QWidget):
         self.update()
 
     def get_current_image(self):
-        """获取当前显示的图像"""
-        return self.display_image if self.display_image is not None else self.original_image
+        """获取当前显示的图像（原始分辨率，display_image 只是可见区域）"""
+        return self.original_image
 
     def paintEvent(self, event):
         """绘制事件 - 绘制图像和覆盖物"""
@@ -154,7 +256,7 @@ class Canvas(QWidget):
         # 填充背景
         painter.fillRect(self.rect(), QColor(250, 250, 250))
 
-        if self.pixmap and not self.pixmap.isNull():
+        if self.original_image is not None and self.q_image is not None:
             # 计算图像在窗口中的位置（居中显示）
             # pixmap_rect = self.pixmap.rect()
             # window_rect = self.rect()
@@ -166,13 +268,20 @@ class Canvas(QWidget):
 
             x, y = self.image_offset
 
-            # 绘制图像
-            painter.drawPixmap(x, y, self.pixmap)
+            # 绘制图像（q_image 只覆盖 render_rect 区域，直接绘制 QImage 省去 QPixmap 转换）
+            if not self.q_image.isNull():
+                painter.drawImage(int(x) + self.render_rect[0], int(y) + self.render_rect[1], self.q_image)
 
             # 绘制裁剪框（如果启用）
             if self.show_crop_rect and self.original_image is not None:
                 self.draw_crop_rect(painter)
 
+            # 加载中占位提示
+            if self.loading:
+                painter.fillRect(0, 0, 180, 28, QColor(0, 0, 0, 120))
+                painter.setPen(QPen(QColor(255, 255, 255), 1))
+                painter.drawText(10, 19, f"Loading frame {self.loading_idx}...")
+
             # 绘制标题和缩放信息
             # painter.setPen(QPen(QColor(0, 255, 0), 1))
             # info_text = f"{self.title} - Zoom: {self.zoom_factor:.1f}x"
@@ -255,10 +364,11 @@ class Canvas(QWidget):
                 dy = event.y() - self.drag_start.y()
 
                 # 更新图像位置
-                x_bund_min = min(0, self.size().width() - self.display_image.shape[1])
-                x_bund_max = max(0, self.size().width() - self.display_image.shape[1])
-                y_bund_min = min(0, self.size().height() - self.display_image.shape[0])
-                y_bund_max = max(0, self.size().height() - self.display_image.shape[0])
+                scaled_w, scaled_h = self.scaled_size
+                x_bund_min = min(0, self.size().width() - scaled_w)
+                x_bund_max = max(0, self.size().width() - scaled_w)
+                y_bund_min = min(0, self.size().height() - scaled_h)
+                y_bund_max = max(0, self.size().height() - scaled_h)
                 new_offset_x = np.clip(self.image_offset[0] + dx, x_bund_min, x_bund_max)
                 new_offset_y = np.clip(self.image_offset[1] + dy, y_bund_min, y_bund_max)
 
@@ -267,7 +377,10 @@ class Canvas(QWidget):
                 self.drag_start = event.pos()
 
                 self.mov_sync.emit(self.image_offset)
-                self.update()  # 触发重绘
+                if self.needs_render():
+                    self.update_display()
+                else:
+                    self.update()  # 触发重绘
 
             if self.rect_dragging and self.drag_start and self.show_crop_rect:
                 # 计算移动距离（原始图像坐标系）
@@ -294,6 +407,12 @@ class Canvas(QWidget):
                 self.update()
 
 
+    def resizeEvent(self, event):
+        """窗口尺寸变化时补渲染新露出的区域"""
+        super().resizeEvent(event)
+        if self.original_image is not None and self.needs_render():
+            self.update_display()
+
     def mouseReleaseEvent(self, event):
         """鼠标释放事件"""
         if event.button() == Qt.LeftButton:
@@ -302,6 +421,53 @@ class Canvas(QWidget):
             self.drag_start = None
 
 
+class LatestFrameLoader(QObject):
+    """
+    最新请求优先的异步帧加载器
+    后台线程执行 load_fn(frm_idx)，过期请求在解码前被取消或在完成后被丢弃，
+    只有最新请求的结果通过 frame_ready 信号送回 UI 线程，load_fn 抛出的异常通过 frame_failed 送回
+    """
+    frame_ready = pyqtSignal(int, object)
+    frame_failed = pyqtSignal(int, str)
+
+    def __init__(self, load_fn, parent=None):
+        super().__init__(parent)
+        self.load_fn = load_fn
+        self.latest_idx = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame_loader")
+
+        self._future = None
+        self._lock = threading.Lock()
+
+    def request(self, frm_idx):
+        """请求加载指定帧，尚未开始的旧请求直接取消"""
+        with self._lock:
+            self.latest_idx = frm_idx
+            if self._future is not None:
+                self._future.cancel()
+            self._future = self.executor.submit(self._run, frm_idx)
+
+    def is_latest(self, frm_idx):
+        return frm_idx == self.latest_idx
+
+    def _run(self, frm_idx):
+        if not self.is_latest(frm_idx):
+            return
+        try:
+            result = self.load_fn(frm_idx)
+        except Exception as e:
+            # 线程池中的异常不会自动抛出，必须通知 UI 线程清除加载提示
+            print(f"Failed to load frame {frm_idx}: {e}")
+            if self.is_latest(frm_idx):
+                self.frame_failed.emit(frm_idx, str(e))
+            return
+        if self.is_latest(frm_idx):
+            self.frame_ready.emit(frm_idx, result)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
 class ClickableSlider(QSlider):
     def __init__(self, orientation=Qt.Horizontal):
         super().__init__(orientation)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Batch registration over clip JSON files:
+Computes the GT -> Low-light homography for every frame in each clip's
+range on a process pool. Results are appended to a JSON lines file as
+chunks finish, so an interrupted run resumes where it stopped.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from clips import load_clip, clip_frame_paths, interpolate_rect
+from map_method import register_feature_pts, register_pyramid, add_registration_args, registration_params
+
+
+def _init_worker():
+    # 每个进程只用一个 OpenCV 线程，并行度由进程池提供，避免线程过度订阅
+    cv2.setNumThreads(1)
+
+
+def align_frame(noisy_path, gt_path, rect, method='ORB', levels=0, reg_params=None):
+    """配准一帧的裁剪区域，返回全图坐标下的单应性矩阵和内点数"""
+    noisy = cv2.imread(noisy_path)
+    gt = cv2.imread(gt_path)
+    if noisy is None or gt is None:
+        raise IOError(f"Failed to read {noisy_path} or {gt_path}")
+    return align_images(noisy, gt, rect, method, levels, reg_params)
+
+
+def align_images(noisy, gt, rect, method='ORB', levels=0, reg_params=None):
+    """
+    配准已解码帧对的裁剪区域，返回全图坐标下的单应性矩阵和内点数；配准失败时抛出 RuntimeError
+    :param reg_params: 传给 register_feature_pts / register_pyramid 的配准参数，见 map_method.registration_params
+    """
+    x, y, w, h = rect
+    src = noisy[y:y + h, x:x + w]
+    dst = gt[y:y + h, x:x + w]
+    reg_params = reg_params or {}
+    if levels > 0:
+        result = register_pyramid(src, dst, method, levels=levels, **reg_params)
+    else:
+        result = register_feature_pts(src, dst, method, **reg_params)
+    # 配准失败时返回的是单位矩阵，不能当作结果写出
+    if result.mask is None:
+        raise RuntimeError("registration failed")
+    mtx = result.mtx
+    inliers = int(np.sum(result.mask))
+
+    S = np.array([[1, 0, x], [0, 1, y], [0, 0, 1]], dtype=np.float64)
+    S_inv = np.array([[1, 0, -x], [0, 1, -y], [0, 0, 1]], dtype=np.float64)
+    return S @ mtx @ S_inv, inliers
+
+
+def align_chunk(clip_path, clip, frames, method='ORB', levels=0, reg_params=None):
+    """进程池任务：配准同一剪辑中连续的一组帧"""
+    noisy_paths, gt_paths = clip_frame_paths(clip)
+    records = []
+    for frm_idx in frames:
+        rect = interpolate_rect(clip, frm_idx)
+        t0 = time.perf_counter()
+        try:
+            mtx, inliers = align_frame(noisy_paths[frm_idx], gt_paths[frm_idx], rect, method, levels, reg_params)
+            record = {"mtx": mtx.tolist(), "inliers": inliers}
+        except Exception as e:
+            record = {"error": str(e)}
+        record.update({"clip": clip_path,
+                       "frame": frm_idx,
+                       "crop_rect": rect,
+                       "method": method,
+                       "levels": levels,
+                       "reg_params": reg_params or {},
+                       "noisy_path": noisy_paths[frm_idx] if frm_idx < len(noisy_paths) else None,
+                       "gt_path": gt_paths[frm_idx] if frm_idx < len(gt_paths) else None,
+                       "elapsed_ms": (time.perf_counter() - t0) * 1000})
+        records.append(record)
+    return records
+
+
+def load_done(out_path, method=None, levels=None, reg_params=None):
+    """
+    读取已有结果文件，返回已成功完成的 (clip, frame) 集合
+    给定 method / levels / reg_params 时只统计参数相同的记录，换参数重跑同一个结果文件时会重新计算
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断时可能写了半行
+                continue
+            if "error" in record:
+                continue
+            if method is not None and record.get("method") != method:
+                continue
+            if levels is not None and record.get("levels") != levels:
+                continue
+            if reg_params is not None and record.get("reg_params", {}) != reg_params:
+                continue
+            done.add((record["clip"], record["frame"]))
+    return done
+
+
+def make_chunks(clip_paths, done, chunk_size):
+    """按剪辑把未完成的帧切分为连续的小块"""
+    chunks = []
+    for clip_path in clip_paths:
+        clip = load_clip(clip_path)
+        frames = [i for i in range(clip["start_frm"], clip["end_frm"] + 1) if (clip_path, i) not in done]
+        for i in range(0, len(frames), chunk_size):
+            chunks.append((clip_path, clip, frames[i:i + chunk_size]))
+    return chunks
+
+
+def batch_align(clip_paths, out_path, method='ORB', levels=0, workers=None, chunk_size=8, reg_params=None):
+    clip_paths = [os.path.abspath(p) for p in clip_paths]
+    workers = workers or os.cpu_count() or 1
+    reg_params = reg_params or {}
+
+    done = load_done(out_path, method, levels, reg_params)
+    chunks = make_chunks(clip_paths, done, chunk_size)
+    total = sum(len(c[2]) for c in chunks)
+    print(f"{len(done)} frames already done, {total} frames in {len(chunks)} chunks, {workers} workers")
+    if not chunks:
+        return
+
+    t0 = time.perf_counter()
+    finished = 0
+    with open(out_path, 'a') as output_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(align_chunk, clip_path, clip, frames, method, levels, reg_params)
+                   for clip_path, clip, frames in chunks]
+        for future in as_completed(futures):
+            records = future.result()
+            for record in records:
+                output_file.write(json.dumps(record) + "\n")
+            # 每块写完立即落盘，保证可续跑
+            output_file.flush()
+            finished += len(records)
+            elapsed = time.perf_counter() - t0
+            print(f"{finished}/{total} frames, {finished / elapsed:.2f} fps")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Batch registration")
+    parser.add_argument('clip_jsons', type=str, nargs='+')
+    parser.add_argument('--out', type=str, default='batch_homographies.jsonl')
+    parser.add_argument('--method', type=str, default='ORB')
+    parser.add_argument('--levels', type=int, default=0, help='pyramid levels, 0 for single-scale')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk_size', type=int, default=8)
+    add_registration_args(parser)
+    args = parser.parse_args()
+
+    batch_align(args.clip_jsons, args.out, args.method, args.levels, args.workers, args.chunk_size,
+                registration_params(args))
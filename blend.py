@@ -0,0 +1,36 @@
+import numpy as np
+import cv2
+
+
+def blend_images(img1, img2, alpha, out=None):
+    """
+    叠加两张图像：img1 * alpha + img2 * (1 - alpha)
+    两图在 (0,0) 处对齐，尺寸不同时不缩放，非重叠部分只保留各自的加权值
+    全程 uint8 定点运算（cv2.addWeighted），不产生全尺寸浮点中间结果；
+    out 为预分配的输出缓冲区，尺寸不符时重新分配
+    """
+    h1, w1 = img1.shape[:2]
+    h2, w2 = img2.shape[:2]
+    canvas_shape = (max(h1, h2), max(w1, w2), 3)
+
+    if out is None or out.shape != canvas_shape or out.dtype != np.uint8:
+        out = np.empty(canvas_shape, dtype=np.uint8)
+
+    # 重叠区域
+    h, w = min(h1, h2), min(w1, w2)
+    cv2.addWeighted(img1[:h, :w], alpha, img2[:h, :w], 1 - alpha, 0, dst=out[:h, :w])
+
+    if (h1, w1) == (h2, w2):
+        return out
+
+    # 非重叠区域：先清零，再写入各自的加权值
+    out[h:, :] = 0
+    out[:h, w:] = 0
+    for img, weight in ((img1, alpha), (img2, 1 - alpha)):
+        img_h, img_w = img.shape[:2]
+        if img_h > h:
+            cv2.convertScaleAbs(img[h:img_h, :img_w], dst=out[h:img_h, :img_w], alpha=weight)
+        if img_w > w:
+            cv2.convertScaleAbs(img[:h, w:img_w], dst=out[:h, w:img_w], alpha=weight)
+
+    return out
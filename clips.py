@@ -0,0 +1,28 @@
+import json
+
+from frame_cache import list_image_files
+
+
+def load_clip(clip_path):
+    """读取 ImageCropper.stop_clip 保存的 clips JSON"""
+    with open(clip_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def clip_frame_paths(clip):
+    """返回 (低光帧路径列表, 正常光帧路径列表)，与 GUI 中的帧序号一一对应"""
+    noisy_paths = list_image_files(clip["low_light_video_path"])
+    gt_paths = list_image_files(clip["normal_light_video_path"])
+    return noisy_paths, gt_paths
+
+
+def interpolate_rect(clip, frm_idx):
+    """在 start_rect 与 end_rect 之间按帧号线性插值裁剪框 [x, y, w, h]"""
+    start_frm, end_frm = clip["start_frm"], clip["end_frm"]
+    start_rect, end_rect = clip["start_rect"], clip["end_rect"]
+    if end_frm <= start_frm:
+        return list(start_rect)
+
+    t = (frm_idx - start_frm) / (end_frm - start_frm)
+    t = min(max(t, 0.0), 1.0)
+    return [int(round(a + (b - a) * t)) for a, b in zip(start_rect, end_rect)]
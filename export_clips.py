@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Headless clip exporter:
+Reads clips JSON files saved by ImageCropper, interpolates the crop rect
+between start_rect and end_rect, and writes aligned low/normal-light crop
+pairs for every frame. Decode processes write frame pairs into a
+shared-memory ring buffer; process workers read them zero-copy, register,
+warp and encode. The number of ring slots bounds the frames in flight, so
+decode, compute and disk writes of different frames overlap.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import cv2
+import numpy as np
+
+from batch_align import _init_worker, align_images, load_done
+from map_method import add_registration_args, registration_params
+from clips import load_clip, clip_frame_paths, interpolate_rect
+from frame_cache import load_frame
+from shm_ring import SharedFrameRing, decode_worker, slot_bytes_for
+from warp import warp_region
+
+
+# 无压缩 TIFF 编码最快，导出 4K 序列时瓶颈在磁盘而不是压缩
+WRITE_PARAMS = {".tif": [cv2.IMWRITE_TIFF_COMPRESSION, 1],
+                ".png": [cv2.IMWRITE_PNG_COMPRESSION, 1]}
+
+
+def load_homographies(path):
+    """读取 batch_align.py 的结果文件，返回 {(clip, frame): (单应性矩阵, 内点数)}，失败的记录不读取"""
+    homographies = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                homographies[(record["clip"], record["frame"])] = (np.array(record["mtx"], dtype=np.float64),
+                                                                   record.get("inliers"))
+    return homographies
+
+
+def clip_output_dirs(out_dir, clip_path):
+    """每个剪辑一个输出目录：<out_dir>/<clip 文件名>/{low,normal}"""
+    clip_dir = os.path.join(out_dir, os.path.splitext(os.path.basename(clip_path))[0])
+    return os.path.join(clip_dir, "low"), os.path.join(clip_dir, "normal")
+
+
+def crop_pair(noisy, gt, rect, mtx=None, inliers=None, method='ORB', levels=0, reg_params=None):
+    """
+    返回 (低光裁剪图, 对齐到低光的正常光裁剪图, 单应性矩阵, 内点数)，只变换裁剪框内的像素
+    配准失败时 align_images 抛出 RuntimeError，该帧记为失败且不写出文件，不会用单位矩阵导出未对齐的帧对
+    """
+    x, y, w, h = rect
+    if mtx is None:
+        mtx, inliers = align_images(noisy, gt, rect, method, levels, reg_params)
+    return noisy[y:y + h, x:x + w], warp_region(gt, mtx, [x, y, x + w, y + h]), mtx, inliers
+
+
+def export_pair(noisy, gt, task, method='ORB', levels=0, reg_params=None):
+    """配准/裁剪/变换 -> 编码写盘，返回结果记录中的矩阵、内点数和耗时"""
+    t0 = time.perf_counter()
+    noisy_crop, gt_crop, mtx, inliers = crop_pair(noisy, gt, task["crop_rect"], task["mtx"], task["inliers"],
+                                                  method, levels, reg_params)
+    t1 = time.perf_counter()
+
+    ext = os.path.splitext(task["noisy_out"])[1]
+    if not (cv2.imwrite(task["noisy_out"], noisy_crop, WRITE_PARAMS.get(ext, [])) and
+            cv2.imwrite(task["gt_out"], gt_crop, WRITE_PARAMS.get(ext, []))):
+        raise IOError(f"Failed to write {task['noisy_out']} or {task['gt_out']}")
+    t2 = time.perf_counter()
+
+    return {"mtx": mtx.tolist(),
+            "inliers": inliers,
+            "align_ms": (t1 - t0) * 1000,
+            "encode_ms": (t2 - t1) * 1000}
+
+
+def process_worker(ring, result_queue, method='ORB', levels=0, reg_params=None):
+    """处理进程：从共享内存环形缓冲区零拷贝读取帧对，完成后归还槽并回报结果记录"""
+    _init_worker()
+    while True:
+        slot, meta = ring.get()
+        if slot is None:
+            break
+        task, shapes, error = meta
+        record = {k: task[k] for k in RECORD_KEYS}
+        record.update(method=method, levels=levels, reg_params=reg_params or {})
+        try:
+            if error is not None:
+                raise IOError(error)
+            noisy, gt = ring.views(slot, shapes)
+            record.update(export_pair(noisy, gt, task, method, levels, reg_params))
+        except Exception as e:
+            record["error"] = str(e)
+        finally:
+            ring.release(slot)
+        result_queue.put(record)
+    ring.close()
+
+
+RECORD_KEYS = ("clip", "frame", "crop_rect", "noisy_out", "gt_out")
+
+
+def check_workers(decode_procs, process_procs):
+    """
+    返回子进程异常的说明，全部正常时返回 None
+    解码进程处理完任务后以退出码 0 正常结束，处理进程在导出完成前不应退出
+    """
+    for proc in decode_procs + process_procs:
+        if proc.exitcode not in (None, 0):
+            return f"{proc.name} exited unexpectedly with code {proc.exitcode}"
+    if not any(proc.is_alive() for proc in process_procs):
+        return "All process workers exited unexpectedly"
+    return None
+
+
+def make_tasks(clip_paths, out_dir, ext, done, homographies):
+    """展开所有剪辑的逐帧任务，跳过已导出的帧"""
+    tasks = []
+    for clip_path in clip_paths:
+        clip = load_clip(clip_path)
+        noisy_paths, gt_paths = clip_frame_paths(clip)
+        low_dir, normal_dir = clip_output_dirs(out_dir, clip_path)
+        os.makedirs(low_dir, exist_ok=True)
+        os.makedirs(normal_dir, exist_ok=True)
+
+        for frm_idx in range(clip["start_frm"], clip["end_frm"] + 1):
+            if (clip_path, frm_idx) in done:
+                continue
+            if frm_idx >= len(noisy_paths) or frm_idx >= len(gt_paths):
+                print(f"Frame {frm_idx} of {clip_path} out of range, skipped")
+                continue
+            file_name = f"{frm_idx:06d}{ext}"
+            mtx, inliers = homographies.get((clip_path, frm_idx), (None, None))
+            tasks.append({"clip": clip_path,
+                          "frame": frm_idx,
+                          "crop_rect": interpolate_rect(clip, frm_idx),
+                          "noisy_path": noisy_paths[frm_idx],
+                          "gt_path": gt_paths[frm_idx],
+                          "noisy_out": os.path.join(low_dir, file_name),
+                          "gt_out": os.path.join(normal_dir, file_name),
+                          "mtx": mtx,
+                          "inliers": inliers})
+    return tasks
+
+
+def estimate_slot_bytes(tasks):
+    """按每个剪辑首帧的尺寸确定环形缓冲区槽大小（一个槽存放一对帧）"""
+    slot_bytes = 0
+    first_tasks = {}
+    for task in tasks:
+        first_tasks.setdefault(task["clip"], task)
+    for task in first_tasks.values():
+        images = [load_frame(task["noisy_path"]), load_frame(task["gt_path"])]
+        if all(image is not None for image in images):
+            slot_bytes = max(slot_bytes, slot_bytes_for(images))
+    return slot_bytes
+
+
+def export_clips(clip_paths, out_dir, method='ORB', levels=0, homography_path=None, workers=None,
+                 decode_workers=None, num_slots=None, ext=".tif", reg_params=None):
+    clip_paths = [os.path.abspath(p) for p in clip_paths]
+    reg_params = reg_params or {}
+    workers = workers or os.cpu_count() or 1
+    decode_workers = decode_workers or max(1, workers // 4)
+    # 槽数即在途帧对上限：限制共享内存占用，同时保证每个处理进程都有下一帧可做
+    num_slots = num_slots or 2 * workers
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 记录文件兼作续跑依据（格式与 batch_align.py 输出一致）
+    record_path = os.path.join(out_dir, "export_records.jsonl")
+    done = load_done(record_path, method, levels, reg_params)
+    homographies = load_homographies(homography_path) if homography_path else {}
+    tasks = make_tasks(clip_paths, out_dir, ext, done, homographies)
+    print(f"{len(done)} frames already exported, {len(tasks)} frames to export, "
+          f"{decode_workers} decode + {workers} process workers")
+    if not tasks:
+        return
+
+    slot_bytes = estimate_slot_bytes(tasks)
+    if slot_bytes == 0:
+        print("Failed to read the first frame of every clip")
+        return
+
+    # 解码进程 -> 共享内存环形缓冲区 -> 处理进程，帧数据不经过 pickle
+    ring = SharedFrameRing(num_slots, slot_bytes)
+    task_queue = mp.Queue()
+    result_queue = mp.Queue()
+    procs = [mp.Process(target=decode_worker, args=(ring, task_queue), name=f"decode-{i}", daemon=True)
+             for i in range(decode_workers)]
+    procs += [mp.Process(target=process_worker, args=(ring, result_queue, method, levels, reg_params), name=f"process-{i}",
+                         daemon=True)
+              for i in range(workers)]
+    for proc in procs:
+        proc.start()
+
+    for task in tasks:
+        task_queue.put((task, [task["noisy_path"], task["gt_path"]]))
+    for _ in range(decode_workers):
+        task_queue.put(None)
+
+    pending = {(task["clip"], task["frame"]): task for task in tasks}
+    t0 = time.perf_counter()
+    try:
+        with open(record_path, 'a') as record_file:
+            while pending:
+                try:
+                    record = result_queue.get(timeout=1.0)
+                except queue.Empty:
+                    failure = check_workers(procs[:decode_workers], procs[decode_workers:])
+                    if failure is None:
+                        continue
+                    # 异常退出的进程手上的帧不会再回报，槽也不会归还：剩余帧全部记为失败并中止导出
+                    print(f"{failure}, {len(pending)} frames not exported")
+                    for task in pending.values():
+                        record = {k: task[k] for k in RECORD_KEYS}
+                        record["error"] = failure
+                        record_file.write(json.dumps(record) + "\n")
+                    record_file.flush()
+                    break
+                pending.pop((record["clip"], record["frame"]), None)
+                if "error" in record:
+                    print(f"Frame {record['frame']} of {record['clip']} failed: {record['error']}")
+                record_file.write(json.dumps(record) + "\n")
+                record_file.flush()
+                finished = len(tasks) - len(pending)
+                elapsed = time.perf_counter() - t0
+                print(f"{finished}/{len(tasks)} frames, {finished / elapsed:.2f} fps")
+    finally:
+        if pending:
+            # 中止时解码进程可能阻塞在取空闲槽上，任务队列也可能还有未取走的任务，直接结束子进程
+            task_queue.cancel_join_thread()
+            for proc in procs:
+                proc.terminate()
+        else:
+            ring.stop(workers)
+        for proc in procs:
+            proc.join(timeout=5.0)
+            if proc.is_alive():
+                proc.terminate()
+        ring.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Clip exporter")
+    parser.add_argument('clip_jsons', type=str, nargs='+')
+    parser.add_argument('--out_dir', type=str, default='exported_clips')
+    parser.add_argument('--method', type=str, default='ORB')
+    parser.add_argument('--levels', type=int, default=0, help='pyramid levels, 0 for single-scale')
+    parser.add_argument('--homographies', type=str, default=None,
+                        help='batch_align.py output, reuse its homographies instead of registering again')
+    parser.add_argument('--workers', type=int, default=None, help='register/warp/encode processes')
+    parser.add_argument('--decode_workers', type=int, default=None, help='decode processes, default workers / 4')
+    parser.add_argument('--num_slots', type=int, default=None,
+                        help='shared-memory frame pair slots (frames in flight), default 2 * workers')
+    parser.add_argument('--ext', type=str, default='.tif', choices=['.tif', '.png'])
+    add_registration_args(parser)
+    args = parser.parse_args()
+
+    export_clips(args.clip_jsons, args.out_dir, args.method, args.levels, args.homographies, args.workers,
+                 args.decode_workers, args.num_slots, args.ext, registration_params(args))
@@ -0,0 +1,148 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from glob import glob
+
+import cv2
+
+
+IMG_EXTENSIONS = ("*.png", "*.jpg", "*.tiff", "*.tif")
+
+
+def list_image_files(folder):
+    """列出文件夹中的所有图像帧（按文件名排序）"""
+    img_files_path = []
+    for ext in IMG_EXTENSIONS:
+        img_files_path += glob(os.path.join(folder, ext))
+    img_files_path.sort()
+    return img_files_path
+
+
+def load_frame(path):
+    """读取单帧（保持 OpenCV 原生 BGR 排列，不做颜色转换），失败时返回 None"""
+    return cv2.imread(path)
+
+
+def _sizeof(value):
+    if value is None:
+        return 0
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    return getattr(value, "nbytes", 0)
+
+
+class FrameCache:
+    """
+    线程安全的 LRU 缓存，按字节数限制内存占用
+    key 任意可哈希对象，value 一般为解码后的 numpy 图像
+    """
+
+    def __init__(self, max_bytes=2 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.cur_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, nbytes=None):
+        if value is None:
+            return
+        nbytes = _sizeof(value) if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.cur_bytes -= old[1]
+            self._items[key] = (value, nbytes)
+            self.cur_bytes += nbytes
+
+            # 淘汰最久未使用的项
+            while self.cur_bytes > self.max_bytes and self._items:
+                _, (_, old_bytes) = self._items.popitem(last=False)
+                self.cur_bytes -= old_bytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.cur_bytes = 0
+
+
+class FramePrefetcher:
+    """
+    帧预取器：按浏览方向在后台线程池中预解码后续 N 帧并放入 FrameCache
+    """
+
+    def __init__(self, cache, load_fn=load_frame, prefetch_num=4, num_workers=2):
+        self.cache = cache
+        self.load_fn = load_fn
+        self.prefetch_num = prefetch_num
+        self.executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="prefetch")
+
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        """同步读取：优先命中缓存，其次等待正在进行的预取，最后直接解码"""
+        image = self.cache.get(path)
+        if image is not None:
+            return image
+
+        with self._lock:
+            future = self._pending.get(path)
+        if future is not None:
+            # prefetch 会取消尚未开始的过期任务，此时退回直接解码
+            try:
+                image = future.result()
+            except CancelledError:
+                image = None
+            if image is not None:
+                return image
+
+        image = self.load_fn(path)
+        self.cache.put(path, image)
+        return image
+
+    def prefetch(self, paths):
+        """提交预取任务，已缓存或正在预取的帧会被跳过"""
+        with self._lock:
+            # 丢弃不再需要、尚未开始的预取任务
+            wanted = set(paths)
+            for path, future in list(self._pending.items()):
+                if path not in wanted and future.cancel():
+                    del self._pending[path]
+
+            for path in paths:
+                if path in self._pending or path in self.cache:
+                    continue
+                future = self.executor.submit(self._load_into_cache, path)
+                self._pending[path] = future
+
+    def _load_into_cache(self, path):
+        try:
+            image = self.load_fn(path)
+            self.cache.put(path, image)
+            return image
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
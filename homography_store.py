@@ -0,0 +1,81 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from map_method import image_digest
+
+
+STORE_FILE_NAME = "homography_cache.sqlite"
+
+
+def make_homography_key(src, dst, method, **params):
+    """由两幅裁剪图的内容哈希、配准方法和参数生成缓存键"""
+    return "|".join([image_digest(src), image_digest(dst), method,
+                     json.dumps(params, sort_keys=True)])
+
+
+class HomographyStore:
+    """
+    基于 SQLite 的单应性矩阵持久缓存
+    每条记录约 200 字节，超过 max_entries 时按最近访问时间淘汰最旧的记录
+    """
+
+    def __init__(self, db_path, max_entries=200000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS homography (
+                key TEXT PRIMARY KEY,
+                mtx TEXT NOT NULL,
+                inliers INTEGER,
+                last_access REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON homography(last_access)")
+        self._conn.commit()
+
+    @classmethod
+    def in_folder(cls, folder, **kwargs):
+        """在指定文件夹（通常为 clips JSON 的保存目录）中打开缓存"""
+        return cls(os.path.join(folder, STORE_FILE_NAME), **kwargs)
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT mtx FROM homography WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE homography SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return np.array(json.loads(row[0]), dtype=np.float64)
+
+    def put(self, key, mtx, inliers=None):
+        mtx_text = json.dumps(np.asarray(mtx, dtype=np.float64).tolist())
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO homography VALUES (?, ?, ?, ?)",
+                               (key, mtx_text, inliers, time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM homography").fetchone()[0]
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM homography").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute("""
+                DELETE FROM homography WHERE key IN (
+                    SELECT key FROM homography ORDER BY last_access LIMIT ?
+                )""", (overflow,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,17 +1,25 @@
 import sys
 import os
 import numpy as np
-import cv2
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout,
                              QWidget, QLabel, QPushButton, QFileDialog, QSlider,
-                             QMessageBox, QScrollArea, QGridLayout, QGroupBox, QLineEdit)
+                             QMessageBox, QScrollArea, QGridLayout, QGroupBox, QLineEdit,
+                             QComboBox, QCheckBox)
 
 from ImgWidget import *
 from map_method import *
+from blend import blend_images
+from warp import warp_region, warp_perspective_tiled, translation, union_rect, contains_rect, rect_area
+from frame_cache import FrameCache
+from homography_store import HomographyStore, STORE_FILE_NAME, make_homography_key
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import json
+import sqlite3
 
 class ImageCropper(QMainWindow):
+    diagnostics_ready = pyqtSignal(object, object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("ImageCropPro - 4-Window Analysis Tool")
@@ -24,6 +32,23 @@ class ImageCropper(QMainWindow):
         self.gt_image = None
         self.original_noisy = None
         self.original_gt = None
+        self.overlay_buffer = None  # 预分配的重叠图像缓冲区
+
+        # 映射属性：配准结果缓存，透明度变化时只重新混合
+        self.mapping_method = 'ORB'
+        self.mapping_levels = 0  # 金字塔层数，0 为单尺度配准
+        self.mapping_estimator = 'RANSAC'
+        self.mapping_early_exit_ratio = None  # 不为 None 时先用最好的匹配估计，内点比例达标即提前结束
+        self.mapping_prealign = False  # 相位相关预对齐，缩小匹配范围，已对齐时跳过 RANSAC
+        self.mapping_cache = FrameCache(max_bytes=512 * 1024 ** 2)
+        self.mapped_key = None
+        self.mapped_buffer = None
+        self.mapped_region = None  # 映射缓冲区中已混合的区域 [x0, y0, x1, y1]
+        self.mapped_registration = None  # (映射键, RegistrationResult)：当前矩阵的匹配细节，供诊断图使用
+        self.full_warp_ratio = 0.9  # 渲染区域超过整帧该比例时改用分块并行整帧变换
+        self.homography_store = None
+        self.homography_store_failed = None  # 打开失败的缓存路径
+        self.vis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mapping_vis")
         self.save_folder = os.getcwd()
         self.noisy_img_folder = os.getcwd()
         self.gt_img_folder = os.getcwd()
@@ -49,6 +74,13 @@ class ImageCropper(QMainWindow):
         # 创建四个图像窗口实例
         self.setup_image_windows()
 
+        # 异步帧加载（拖动进度条时只渲染最新请求的帧）
+        self.decode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gt_decode")
+        self.frame_loader = LatestFrameLoader(self.load_frame_pair, self)
+        self.frame_loader.frame_ready.connect(self.on_frame_pair_ready)
+        self.frame_loader.frame_failed.connect(self.on_frame_pair_failed)
+        self.diagnostics_ready.connect(self.on_mapping_diagnostics_ready)
+
         # UI 设置
         self.setup_ui()
 
@@ -173,12 +205,47 @@ class ImageCropper(QMainWindow):
         # if value != self.frm_idx:
         self.frm_idx = value
         self.curr_frm_idx_edit.setText(str(self.frm_idx))
-        self.noisy_display.set_image_via_idx(self.frm_idx)
-        self.gt_display.set_image_via_idx(self.frm_idx)
+        self.noisy_display.set_loading(self.frm_idx)
+        self.gt_display.set_loading(self.frm_idx)
+        self.frame_loader.request(self.frm_idx)
+
+    def load_frame_pair(self, frm_idx):
+        """后台线程：并行读取噪声帧和真实值帧（OpenCV 解码时释放 GIL），两帧都就绪后一起返回"""
+        gt_future = self.decode_executor.submit(self.load_canvas_frame, self.gt_display, frm_idx)
+        noisy = self.load_canvas_frame(self.noisy_display, frm_idx)
+        return noisy, gt_future.result()
+
+    @staticmethod
+    def load_canvas_frame(canvas, frm_idx):
+        """没有图像序列时返回 None；文件无法解码（cv2.imread 返回 None）时抛出 IOError，由加载器发出 frame_failed"""
+        if not canvas.img_files_path:
+            return None
+        image = canvas.load_frame(frm_idx)
+        if image is None:
+            raise IOError(f"Failed to decode {canvas.img_files_path[frm_idx]}")
+        return image
+
+    def on_frame_pair_ready(self, frm_idx, pair):
+        """UI 线程：显示最新请求的帧，过期结果直接丢弃"""
+        if frm_idx != self.frm_idx:
+            return
+        noisy, gt = pair
+        if self.noisy_display.img_files_path:
+            self.noisy_display.show_frame(frm_idx, noisy)
+        if self.gt_display.img_files_path:
+            self.gt_display.show_frame(frm_idx, gt)
         self.noisy_image = self.noisy_display.original_image
         self.gt_image = self.gt_display.original_image
         self.update_overlay()
 
+    def on_frame_pair_failed(self, frm_idx, error):
+        """UI 线程：最新请求的帧读取失败时清除加载提示并报告错误"""
+        if frm_idx != self.frm_idx:
+            return
+        self.noisy_display.clear_loading()
+        self.gt_display.clear_loading()
+        self.status_label.setText(f"Failed to load frame {frm_idx}: {error}")
+
 
     def toggle_play(self):
         input_idx = int(self.curr_frm_idx_edit.text())
@@ -339,6 +406,7 @@ class ImageCropper(QMainWindow):
         self.overlay_alpha_slider.setRange(0, 100)
         self.overlay_alpha_slider.setValue(50)
         self.overlay_alpha_slider.valueChanged.connect(self.update_overlay)
+        self.overlay_alpha_slider.valueChanged.connect(self.update_mapped_alpha)
         overlay_layout.addWidget(self.overlay_alpha_slider)
 
         layout.addWidget(overlay_group)
@@ -352,6 +420,43 @@ class ImageCropper(QMainWindow):
         self.btn_apply_mapping.setEnabled(False)
         mapping_layout.addWidget(self.btn_apply_mapping)
 
+        self.coarse_to_fine_check = QCheckBox("Coarse-to-fine (pyramid)")
+        self.coarse_to_fine_check.setToolTip("Estimate on a 1/4 scale image, then refine with ECC")
+        self.coarse_to_fine_check.toggled.connect(self.toggle_coarse_to_fine)
+        mapping_layout.addWidget(self.coarse_to_fine_check)
+
+        estimator_layout = QHBoxLayout()
+        estimator_layout.addWidget(QLabel("Estimator:"))
+        self.estimator_combo = QComboBox()
+        self.estimator_combo.addItems(list(ESTIMATORS) + ['AFFINE'])
+        self.estimator_combo.currentTextChanged.connect(self.set_mapping_estimator)
+        estimator_layout.addWidget(self.estimator_combo)
+        mapping_layout.addLayout(estimator_layout)
+
+        self.early_exit_check = QCheckBox(f"Early exit (inlier ratio >= {EARLY_EXIT_RATIO})")
+        self.early_exit_check.setToolTip("Fit the best matches first and skip the full robust fit "
+                                         "when enough of all matches agree with it")
+        self.early_exit_check.toggled.connect(self.toggle_early_exit)
+        mapping_layout.addWidget(self.early_exit_check)
+
+        self.prealign_check = QCheckBox("Phase-correlation pre-align")
+        self.prealign_check.setToolTip("Estimate the global shift with FFT phase correlation, keep only matches "
+                                       "consistent with it and skip RANSAC when the pair is already aligned")
+        self.prealign_check.toggled.connect(self.toggle_prealign)
+        mapping_layout.addWidget(self.prealign_check)
+
+        vis_layout = QHBoxLayout()
+        vis_layout.addWidget(QLabel("Visualization:"))
+        self.vis_mode_combo = QComboBox()
+        self.vis_mode_combo.addItem("Off", VIS_OFF)
+        self.vis_mode_combo.addItem("Diagnostics", VIS_ARRAY)
+        self.vis_mode_combo.addItem("Interactive", VIS_INTERACTIVE)
+        self.vis_mode_combo.setToolTip("Off: mapping only\n"
+                                       "Diagnostics: draw matches into the mapped view (background)\n"
+                                       "Interactive: matplotlib window (blocking)")
+        vis_layout.addWidget(self.vis_mode_combo)
+        mapping_layout.addLayout(vis_layout)
+
         # self.mapping_info = QLabel("Current: Simple Overlay")
         # self.mapping_info.setWordWrap(True)
         # mapping_layout.addWidget(self.mapping_info)
@@ -484,22 +589,9 @@ class ImageCropper(QMainWindow):
             self.btn_apply_mapping.setEnabled(True)
 
     def create_overlay_image(self, alpha):
-        """创建重叠图像 - 在(0,0)处对齐，不调整尺寸"""
-        h1, w1 = self.noisy_image.shape[:2]
-        h2, w2 = self.gt_image.shape[:2]
-
-        # 取较大的尺寸作为画布大小
-        canvas_height = max(h1, h2)
-        canvas_width = max(w1, w2)
-
-        # 创建画布
-        overlay = np.zeros((canvas_height, canvas_width, 3), dtype=np.float64)
-
-        # 分别叠加两张图像
-        overlay[:h1, :w1] += self.noisy_image * alpha
-        overlay[:h2, :w2] += self.gt_image * (1 - alpha)
-
-        return overlay.astype(np.uint8)
+        """创建重叠图像 - 在(0,0)处对齐，不调整尺寸；结果写入复用的 overlay_buffer"""
+        self.overlay_buffer = blend_images(self.noisy_image, self.gt_image, alpha, out=self.overlay_buffer)
+        return self.overlay_buffer
 
     def apply_mapping(self):
         if self.noisy_image is not None and self.gt_image is not None:
@@ -509,52 +601,267 @@ class ImageCropper(QMainWindow):
                 self.mapped_display.set_image(mapped_image)
                 self.status_label.setText("Mapping applied successfully!")
 
+                vis_mode = self.vis_mode_combo.currentData()
+                if vis_mode in (VIS_ARRAY, VIS_INTERACTIVE):
+                    self.request_mapping_diagnostics(vis_mode)
+
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to apply mapping: {str(e)}")
 
     def create_mapped_image(self):
-        """创建映射图像（占位符）"""
+        """创建映射图像：配准结果按 (帧对, 裁剪框, 方法) 缓存，只变换并混合裁剪框和可见视口"""
+        self.mapped_key = self.get_mapping_key()
+        layers = self.get_mapped_layers(self.mapped_key, self.get_mapping_region())
+        return self.blend_mapped_layers(layers)
+
+    def get_mapping_key(self):
+        return (self.noisy_display.img_current_path, self.gt_display.img_current_path,
+                tuple(self.crop_rect), self.mapping_method, tuple(sorted(self.get_registration_params().items())))
+
+    def get_registration_params(self):
+        """当前设置下传给 register_feature_pts / register_pyramid 的参数，同时作为两级缓存键的一部分"""
+        params = dict(min_matches=10, estimator=self.mapping_estimator)
+        if self.mapping_early_exit_ratio is not None:
+            params.update(early_exit_ratio=self.mapping_early_exit_ratio)
+        if self.mapping_prealign:
+            params.update(prealign=True)
+        if self.mapping_levels > 0:
+            params.update(levels=self.mapping_levels, refine='ecc')
+        return params
+
+    def get_mapped_size(self):
+        """映射图像尺寸：两帧尺寸不同时取较小值（与缩放到同一尺寸后混合一致）"""
+        h1, w1 = self.noisy_image.shape[:2]
+        h2, w2 = self.gt_image.shape[:2]
+        return min(h1, h2), min(w1, w2)
+
+    def get_mapping_region(self):
+        """需要渲染的区域：裁剪框 ∪ 映射窗口可见视口（图像坐标），接近整帧时直接取整帧"""
+        frame_h, frame_w = self.get_mapped_size()
         x, y, w, h = self.crop_rect
-        src = self.noisy_image[y:y + h, x:x + w]
-        dst = self.gt_image[y:y + h, x:x + w]
+        visible = self.mapped_display.visible_image_region(frame_w, frame_h, self.mapped_display.render_margin)
+        region = union_rect([x, y, x + w, y + h], visible)
+        region = [max(0, region[0]), max(0, region[1]), min(frame_w, region[2]), min(frame_h, region[3])]
+        if rect_area(region) >= self.full_warp_ratio * frame_w * frame_h:
+            region = [0, 0, frame_w, frame_h]
+        return region
+
+    def get_mapped_layers(self, key, region):
+        """
+        返回 (帧坐标系单应性矩阵, 区域, 噪声图层, 变换后的真实值图层)，图层只覆盖 region；
+        命中缓存且区域已覆盖时直接返回，区域不足时复用矩阵只重新做变换
+        """
+        layers = self.mapping_cache.get(key)
+        if layers is not None and contains_rect(layers[1], region):
+            return layers
+
+        if layers is not None:
+            mtx_frame = layers[0]
+        else:
+            mtx_frame = self.get_mapping_homography()
+
+        frame_h, frame_w = self.get_mapped_size()
+        h_org, w_org = self.noisy_image.shape[:2]
+        x0, y0, x1, y1 = region
+        if (h_org, w_org) == (frame_h, frame_w):
+            # 拷贝区域：视图会让缓存项一直持有整帧图像，且不计入缓存大小
+            noisy_layer = self.noisy_image[y0:y1, x0:x1].copy()
+        else:
+            noisy_layer = warp_region(self.noisy_image, self.frame_scale(), region)
+
+        if region == [0, 0, frame_w, frame_h]:
+            warpped_gt_image = warp_perspective_tiled(self.gt_image, mtx_frame, (frame_w, frame_h))
+        else:
+            warpped_gt_image = warp_region(self.gt_image, mtx_frame, region)
 
-        mtx = mapping_feature_pts(src, dst)
+        layers = (mtx_frame, region, noisy_layer, warpped_gt_image)
+        self.mapping_cache.put(key, layers, nbytes=noisy_layer.nbytes + warpped_gt_image.nbytes)
+        return layers
 
-        # Coordinate scaling
+    def frame_scale(self):
+        """噪声图坐标到映射图像坐标的缩放矩阵"""
+        frame_h, frame_w = self.get_mapped_size()
         h_org, w_org = self.noisy_image.shape[:2]
-        # scale_h = h_org / (h)
-        # scale_w = w_org / (w)
-        S = np.array([
-            [1, 0, x],
-            [0, 1, y],
-            [0, 0, 1]
-        ])
-        # 构建逆缩放矩阵
-        S_inv = np.array([
-            [1, 0, -x],
-            [0, 1, -y],
-            [0, 0, 1]
-        ])
-        mtx_scale = S @ mtx @ S_inv
-        # mtx_scale = mtx
-
-        warpped_gt_image = cv2.warpPerspective(self.gt_image, mtx_scale, (w_org, h_org))
+        return np.diag([frame_w / w_org, frame_h / h_org, 1.0])
 
+    def get_mapping_homography(self):
+        """计算裁剪框内的单应性矩阵并换算到映射图像坐标系，配准失败时抛出 RuntimeError"""
+        x, y, w, h = self.crop_rect
+        src, dst = self.get_crop_pair()
+
+        # 先查询持久缓存（按裁剪图内容哈希），未命中才做特征匹配
+        store = self.get_homography_store()
+        params = self.get_registration_params()
+        store_key = make_homography_key(src, dst, self.mapping_method, **params)
+        mtx = None
+        if store is not None:
+            try:
+                mtx = store.get(store_key)
+            except sqlite3.Error as e:
+                print(f"Homography store read failed: {e}")
+        if mtx is None:
+            if 'levels' in params:
+                result = register_pyramid(src, dst, method=self.mapping_method, **params)
+            else:
+                result = register_feature_pts(src, dst, method=self.mapping_method, **params)
+            # 配准失败时返回的是单位矩阵，不写入缓存，下次重新配准
+            if result.mask is None:
+                raise RuntimeError("Registration failed: not enough reliable feature matches in the crop rect")
+            mtx = result.mtx
+            if store is not None:
+                try:
+                    store.put(store_key, mtx, inliers=int(np.sum(result.mask)))
+                except sqlite3.Error as e:
+                    print(f"Homography store write failed: {e}")
+            self.mapped_registration = (self.mapped_key, result)
+
+        # Coordinate scaling：裁剪框坐标 -> 整帧坐标，两帧尺寸不同时再缩放到映射图像尺寸
+        mtx_scale = translation(x, y) @ mtx @ translation(-x, -y)
+        return self.frame_scale() @ mtx_scale
+
+    def blend_mapped_layers(self, layers):
+        """把区域图层混合写入整帧尺寸的映射缓冲区，区域外保持黑色"""
+        _, region, noisy_layer, warpped_gt_image = layers
+        frame_h, frame_w = self.get_mapped_size()
+        if self.mapped_buffer is None or self.mapped_buffer.shape != (frame_h, frame_w, 3):
+            self.mapped_buffer = np.zeros((frame_h, frame_w, 3), dtype=np.uint8)
+        elif region != self.mapped_region:
+            self.mapped_buffer.fill(0)
+        self.mapped_region = region
+
+        x0, y0, x1, y1 = region
         alpha = self.overlay_alpha_slider.value() / 100.0
+        blend_images(noisy_layer, warpped_gt_image, alpha, out=self.mapped_buffer[y0:y1, x0:x1])
+        return self.mapped_buffer
 
-        h1, w1 = self.noisy_image.shape[:2]
-        h2, w2 = self.gt_image.shape[:2]
+    def refresh_mapped_region(self):
+        """平移/缩放映射窗口后，可见视口超出已变换区域时补做变换（复用缓存的单应性矩阵）"""
+        if self.mapped_key is None or self.mapped_buffer is None:
+            return
+        if self.mapped_display.original_image is not self.mapped_buffer:
+            return  # 正在显示诊断图
+        if self.mapped_key != self.get_mapping_key():
+            return  # 帧或裁剪框已变化，等待重新应用映射
+        region = self.get_mapping_region()
+        if contains_rect(self.mapped_region, region):
+            return
+        layers = self.get_mapped_layers(self.mapped_key, region)
+        self.mapped_display.set_image(self.blend_mapped_layers(layers))
 
-        if h1 != h2 or w1 != w2:
-            min_h, min_w = min(h1, h2), min(w1, w2)
-            noisy_resized = cv2.resize(self.noisy_image, (min_w, min_h))
-            warpped_gt_image = cv2.resize(warpped_gt_image, (min_w, min_h))
-        else:
-            noisy_resized = self.noisy_image
-            warpped_gt_image = warpped_gt_image
+    def toggle_coarse_to_fine(self, checked):
+        self.mapping_levels = 2 if checked else 0
+
+    def set_mapping_estimator(self, estimator):
+        self.mapping_estimator = estimator
+
+    def toggle_early_exit(self, checked):
+        self.mapping_early_exit_ratio = EARLY_EXIT_RATIO if checked else None
 
-        mapped = cv2.addWeighted(noisy_resized, alpha, warpped_gt_image, 1 - alpha, 0)
-        return mapped
+    def toggle_prealign(self, checked):
+        self.mapping_prealign = checked
+
+    def get_crop_pair(self):
+        """返回当前裁剪框内的 (噪声图, 真实值图) 视图"""
+        x, y, w, h = self.crop_rect
+        return self.noisy_image[y:y + h, x:x + w], self.gt_image[y:y + h, x:x + w]
+
+    def request_mapping_diagnostics(self, vis_mode=VIS_ARRAY):
+        """
+        绘制当前映射的配准诊断：VIS_ARRAY 在后台线程绘制诊断图并显示到映射窗口；
+        VIS_INTERACTIVE 弹出 matplotlib 窗口，只能在 UI 线程显示，需要重新配准时仍放到后台线程
+        """
+        src, dst = self.get_crop_pair()
+        key = self.mapped_key
+        x, y, _, _ = self.crop_rect
+
+        # 屏幕上实际使用的矩阵（来自映射缓存），换算回裁剪框坐标系
+        layers = self.mapping_cache.get(key)
+        mtx = None
+        if layers is not None:
+            mtx = translation(-x, -y) @ np.linalg.inv(self.frame_scale()) @ layers[0] @ translation(x, y)
+        result = None
+        if self.mapped_registration is not None and self.mapped_registration[0] == key:
+            result = self.mapped_registration[1]
+
+        if vis_mode == VIS_INTERACTIVE and result is not None:
+            show_registration(src, dst, self.resolve_mapping_registration(
+                src, dst, result, mtx, self.mapping_method, self.get_registration_params()))
+            return
+
+        self.status_label.setText("Mapping applied, rendering diagnostics...")
+        future = self.vis_executor.submit(self.render_mapping_diagnostics, src, dst, result, mtx,
+                                          self.mapping_method, self.get_registration_params(), vis_mode)
+        future.add_done_callback(lambda f: self.diagnostics_ready.emit(key, f))
+
+    @staticmethod
+    def resolve_mapping_registration(src, dst, result, mtx, method, params):
+        """
+        返回产生当前矩阵的那次配准的匹配细节，矩阵替换为屏幕上实际使用的矩阵；
+        矩阵来自持久缓存、没有匹配细节时，才按相同的方法和配准参数重新配准
+        """
+        if result is None:
+            if 'levels' in params:
+                result = register_pyramid(src, dst, method, **params)
+            else:
+                result = register_feature_pts(src, dst, method, **params)
+        if mtx is not None:
+            result = result._replace(mtx=mtx)
+        return result
+
+    @classmethod
+    def render_mapping_diagnostics(cls, src, dst, result, mtx, method, params, vis_mode=VIS_ARRAY):
+        """后台线程：返回 (src, dst, 诊断图或配准结果)，VIS_INTERACTIVE 只做配准，窗口交给 UI 线程弹出"""
+        result = cls.resolve_mapping_registration(src, dst, result, mtx, method, params)
+        if vis_mode == VIS_INTERACTIVE:
+            return src, dst, result
+        return src, dst, render_registration(src, dst, result)
+
+    def on_mapping_diagnostics_ready(self, key, future):
+        """UI 线程：显示诊断图或弹出交互窗口，映射已更新时丢弃过期结果"""
+        if key != self.mapped_key:
+            return
+        try:
+            src, dst, diagnostics = future.result()
+        except Exception as e:
+            self.status_label.setText(f"Failed to render diagnostics: {str(e)}")
+            return
+        if isinstance(diagnostics, RegistrationResult):
+            self.status_label.setText("Mapping applied successfully!")
+            show_registration(src, dst, diagnostics)
+            return
+        self.mapped_display.set_image(diagnostics)
+        self.status_label.setText("Mapping diagnostics rendered.")
+
+    def get_homography_store(self):
+        """
+        打开保存文件夹（clips JSON 所在目录）中的单应性矩阵缓存
+        无法打开时（只读目录、数据库损坏等）返回 None，不使用缓存继续配准，同一路径不再重试
+        """
+        db_path = os.path.join(self.save_folder, STORE_FILE_NAME)
+        if db_path == self.homography_store_failed:
+            return None
+        if self.homography_store is None or self.homography_store.db_path != db_path:
+            if self.homography_store is not None:
+                self.homography_store.close()
+                self.homography_store = None
+            try:
+                self.homography_store = HomographyStore.in_folder(self.save_folder)
+            except (sqlite3.Error, OSError) as e:
+                print(f"Failed to open homography store {db_path}, continuing without it: {e}")
+                self.homography_store_failed = db_path
+                return None
+        return self.homography_store
+
+    def update_mapped_alpha(self):
+        """透明度变化时仅用缓存的图层重新混合映射图像，正在显示诊断图时不覆盖"""
+        if self.mapped_key is None:
+            return
+        if self.mapped_display.original_image is not self.mapped_buffer:
+            return
+        layers = self.mapping_cache.get(self.mapped_key)
+        if layers is None:
+            return
+        self.mapped_display.set_image(self.blend_mapped_layers(layers))
 
     def update_crop_rect(self, rect):
         """更新裁剪区域"""
@@ -567,6 +874,7 @@ class ImageCropper(QMainWindow):
         self.gt_display.set_offset(offset)
         self.overlay_display.set_offset(offset)
         self.mapped_display.set_offset(offset)
+        self.refresh_mapped_region()
 
     def update_zoom(self, zoom_factor):
         self.zoom_factor = zoom_factor
@@ -588,6 +896,7 @@ class ImageCropper(QMainWindow):
         self.gt_display.set_zoom(self.zoom_factor)
         self.overlay_display.set_zoom(self.zoom_factor)
         self.mapped_display.set_zoom(self.zoom_factor)
+        self.refresh_mapped_region()
 
     def start_clip(self):
         # """裁剪所有图像"""
@@ -617,7 +926,8 @@ class ImageCropper(QMainWindow):
         # except Exception as e:
         #     QMessageBox.critical(self, "Error", f"Failed to crop images: {str(e)}")
         self.clip_attr["start_frm"] =  self.frm_idx
-        self.clip_attr["start_rect"] = self.crop_rect
+        # 画布拖动时会原地修改 crop_rect，必须保存副本，否则起止框始终相同、导出时无法插值
+        self.clip_attr["start_rect"] = list(self.crop_rect)
         self.status_label.setText(f"Selected start frame: {self.clip_attr['start_frm']}")
         self.btn_clip_start.setEnabled(False)
         self.btn_clip_end.setEnabled(True)
@@ -630,7 +940,7 @@ class ImageCropper(QMainWindow):
             return
 
         self.clip_attr["end_frm"] = self.frm_idx
-        self.clip_attr["end_rect"] = self.crop_rect
+        self.clip_attr["end_rect"] = list(self.crop_rect)
         self.clip_attr["low_light_video_path"] = self.noisy_img_folder
         self.clip_attr["low_light_video_name"] = os.path.basename(self.noisy_img_folder)
         self.clip_attr["normal_light_video_path"] = self.gt_img_folder
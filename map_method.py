@@ -1,64 +1,209 @@
 import sys
 import os
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
 from PIL.ImageChops import overlay
 from matplotlib import pyplot as plt
 
+from frame_cache import FrameCache
 
-def mapping_of(src, dst):
+
+def image_digest(img):
+    """图像内容哈希（blake2b），用于缓存键；按行更新，裁剪视图无需整体复制"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((img.shape, img.dtype.str)).encode())
+    if img.flags['C_CONTIGUOUS']:
+        h.update(img.data)
+    else:
+        for row in img:
+            h.update(np.ascontiguousarray(row).data)
+    return h.hexdigest()
+
+
+def mapping_of(src, dst, log_polar=False):
     """
     Alignment method mapping normal-light img to low-light img.
+    基于 FFT 相位相关的快速全局对齐，毫秒级给出初始变换
     :param src: Low-light img
     :param dst: GT img
+    :param log_polar: 同时估计旋转和缩放（对数极坐标相位相关）
     :return: 3*3 array as perspective matrix
     """
     assert src.shape == dst.shape
-    mtx = np.array([[1, 0, 0],
-                    [0, 1, 0],
-                    [0, 0, 1]])
-
+    mtx, _ = estimate_phase_shift(src, dst, log_polar=log_polar)
     return mtx
 
-def mapping_feature_pts(src, dst, method='ORB', min_matches=10):
-    assert src.shape == dst.shape
-    mtx = np.array([[1, 0, 0],
-                    [0, 1, 0],
-                    [0, 0, 1]])
 
-    # 初始化特征检测器
+def _to_gray_float(img, levels):
+    img = downsample(img, levels) if levels > 0 else img
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img.astype(np.float32)
+
+
+def _log_polar_spectrum(gray):
+    """幅度谱（对平移不变）经高通滤波后做对数极坐标变换：旋转和缩放变为平移"""
+    n = gray.shape[0]
+    window = cv2.createHanningWindow((n, n), cv2.CV_32F)
+    spectrum = np.abs(np.fft.fftshift(np.fft.fft2(gray * window)))
+
+    # 高通滤波，抑制低频对配准的主导
+    ramp = np.cos(np.pi * (np.arange(n) / n - 0.5))
+    xy = ramp[:, None] * ramp[None, :]
+    spectrum = (spectrum * (1.0 - xy) * (2.0 - xy)).astype(np.float32)
+
+    max_radius = n / 2
+    log_polar = cv2.warpPolar(spectrum, (n, n), (n / 2, n / 2), max_radius,
+                              cv2.WARP_POLAR_LOG | cv2.INTER_LINEAR)
+    return log_polar, max_radius
+
+
+def estimate_rotation_scale(src_gray, dst_gray):
+    """
+    用对数极坐标相位相关估计 dst -> src 的旋转角度（度，逆时针为正）和缩放
+    只使用中心正方形区域；幅度谱的对称性使角度存在 180° 歧义，结果归一化到 (-90, 90]
+    """
+    h, w = src_gray.shape[:2]
+    n = min(h, w)
+    y0, x0 = (h - n) // 2, (w - n) // 2
+    lp_src, max_radius = _log_polar_spectrum(src_gray[y0:y0 + n, x0:x0 + n])
+    lp_dst, _ = _log_polar_spectrum(dst_gray[y0:y0 + n, x0:x0 + n])
+
+    (shift_rho, shift_angle), response = cv2.phaseCorrelate(lp_dst, lp_src)
+    angle = -shift_angle * 360.0 / n
+    angle = (angle + 90.0) % 180.0 - 90.0
+    scale = np.exp(-shift_rho * np.log(max_radius) / n)
+    return angle, scale, response
+
+
+def estimate_phase_shift(src, dst, levels=1, log_polar=False):
+    """
+    FFT 相位相关估计全局变换 (GT -> Low-light)
+    :param levels: 在 1/2^levels 分辨率上计算
+    :param log_polar: 先估计旋转和缩放，再估计平移
+    :return: (3*3 矩阵, 相关峰值响应 0~1，越大越可信)
+    """
+    src_gray = _to_gray_float(src, levels)
+    dst_gray = _to_gray_float(dst, levels)
+    h, w = src_gray.shape[:2]
+
+    rot = np.eye(3)
+    if log_polar:
+        angle, scale, _ = estimate_rotation_scale(src_gray, dst_gray)
+        rot[:2] = cv2.getRotationMatrix2D((w / 2, h / 2), angle, scale)
+        dst_gray = cv2.warpAffine(dst_gray, rot[:2], (w, h))
+
+    window = cv2.createHanningWindow((w, h), cv2.CV_32F)
+    (dx, dy), response = cv2.phaseCorrelate(dst_gray, src_gray, window)
+    mtx = np.array([[1, 0, dx],
+                    [0, 1, dy],
+                    [0, 0, 1]]) @ rot
+
+    # 映射回全分辨率坐标
+    S = np.diag([src.shape[1] / w, src.shape[0] / h, 1.0])
+    return S @ mtx @ np.linalg.inv(S), response
+
+
+def create_detector(method):
+    """初始化特征检测器"""
     if method == 'SIFT':
-        detector = cv2.SIFT_create()
+        return cv2.SIFT_create()
     elif method == 'ORB':
-        detector = cv2.ORB_create(nfeatures=5000)
+        return cv2.ORB_create(nfeatures=5000)
     elif method == 'AKAZE':
-        detector = cv2.AKAZE_create()
+        return cv2.AKAZE_create()
     elif method == 'BRISK':
-        detector = cv2.BRISK_create()
+        return cv2.BRISK_create()
     else:
         raise ValueError("不支持的检测方法，请选择: 'SIFT', 'ORB', 'AKAZE', 'BRISK'")
 
-    src_gray = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
-    dst_gray = cv2.cvtColor(dst, cv2.COLOR_BGR2GRAY)
-
-    kp1, des1 = detector.detectAndCompute(src_gray, None)
-    kp2, des2 = detector.detectAndCompute(dst_gray, None)
 
-    if des1 is None or des2 is None:
-        print("No keypoints detected.")
-        return mtx
-
-    # 特征匹配
+def create_matcher(method):
+    """初始化特征匹配器"""
     if method == 'SIFT' or method == 'AKAZE':
         # 对于 SIFT 和 AKAZE 使用 FLANN 匹配器
-        FLANN_INDEX_KDTREE = 1
-        index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+        if method == 'SIFT':
+            FLANN_INDEX_KDTREE = 1
+            index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+        else:
+            # AKAZE 描述子为二进制，KD 树不支持，改用 LSH 索引
+            FLANN_INDEX_LSH = 6
+            index_params = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
         search_params = dict(checks=50)
-        matcher = cv2.FlannBasedMatcher(index_params, search_params)
+        return cv2.FlannBasedMatcher(index_params, search_params)
     else:
         # 对于 ORB 和 BRISK 使用暴力匹配器
-        matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        return cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+
+
+# 配准可视化模式
+VIS_OFF = 'off'
+VIS_ARRAY = 'array'
+VIS_INTERACTIVE = 'interactive'
+
+# 鲁棒估计方法
+ESTIMATORS = {
+    'RANSAC': cv2.RANSAC,
+    'LMEDS': cv2.LMEDS,
+    'RHO': cv2.RHO,
+    'USAC': cv2.USAC_DEFAULT,
+    'MAGSAC': cv2.USAC_MAGSAC,
+    'PROSAC': cv2.USAC_PROSAC,
+}
 
+RegistrationResult = namedtuple('RegistrationResult', ['mtx', 'kp1', 'kp2', 'matches', 'mask'])
+
+# 检测器和匹配器按线程、按方法复用（OpenCV 对象不保证跨线程并发安全）
+_thread_pool = threading.local()
+# 两侧图像并行检测特征（OpenCV 检测时释放 GIL）
+_detect_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="detect")
+# 关键点与描述子缓存，键为 (图像内容哈希, 方法)
+_feature_cache = FrameCache(max_bytes=256 * 1024 ** 2)
+
+
+def clear_feature_cache():
+    """清空关键点缓存（基准测试时保证每次都重新检测）"""
+    _feature_cache.clear()
+
+
+def get_detector(method):
+    detectors = _thread_pool.__dict__.setdefault("detectors", {})
+    if method not in detectors:
+        detectors[method] = create_detector(method)
+    return detectors[method]
+
+
+def get_matcher(method):
+    matchers = _thread_pool.__dict__.setdefault("matchers", {})
+    if method not in matchers:
+        matchers[method] = create_matcher(method)
+    return matchers[method]
+
+
+def detect_features(img, method='ORB'):
+    """检测关键点并计算描述子，结果按图像内容缓存：同一幅图只检测一次"""
+    key = (image_digest(img), method)
+    cached = _feature_cache.get(key)
+    if cached is not None:
+        return cached
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    kp, des = get_detector(method).detectAndCompute(gray, None)
+
+    # KeyPoint 对象按每个约 64 字节估算
+    nbytes = len(kp) * 64 + (des.nbytes if des is not None else 0)
+    _feature_cache.put(key, (kp, des), nbytes=nbytes)
+    return kp, des
+
+
+def match_features(des1, des2, method='ORB'):
+    """特征匹配并筛选良好匹配"""
+    matcher = get_matcher(method)
     if method == 'SIFT' or method == 'AKAZE':
         matches = matcher.knnMatch(des1, des2, k=2)
         # 应用 Lowe's ratio test
@@ -74,28 +219,373 @@ def mapping_feature_pts(src, dst, method='ORB', min_matches=10):
         matches = sorted(matches, key=lambda x: x.distance)
         # 取前 80% 的匹配点
         good_matches = matches[:int(len(matches) * 0.8)]
+    return good_matches
+
+
+def _estimate(dst_pts, src_pts, estimator, threshold, confidence, max_iters):
+    if estimator == 'AFFINE':
+        # 只估计仿射变换（两帧已接近时更快、更稳定）
+        affine, mask = cv2.estimateAffine2D(dst_pts, src_pts, method=cv2.RANSAC, ransacReprojThreshold=threshold,
+                                            maxIters=max_iters, confidence=confidence)
+        if affine is None:
+            return None, None
+        return np.vstack([affine, [0, 0, 1]]), mask
+
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"不支持的估计方法，请选择: {', '.join(list(ESTIMATORS) + ['AFFINE'])}")
+    return cv2.findHomography(dst_pts, src_pts, ESTIMATORS[estimator], threshold,
+                              maxIters=max_iters, confidence=confidence)
+
+
+def _fit_least_squares(dst_pts, src_pts, affine=False):
+    if affine:
+        A = np.hstack([dst_pts.reshape(-1, 2), np.ones((len(dst_pts), 1))])
+        coeffs, _, _, _ = np.linalg.lstsq(A, src_pts.reshape(-1, 2), rcond=None)
+        return np.vstack([coeffs.T, [0, 0, 1]])
+    mtx, _ = cv2.findHomography(dst_pts, src_pts, 0)
+    return mtx
+
+
+def estimate_homography(dst_pts, src_pts, estimator='RANSAC', threshold=5.0, confidence=0.995, max_iters=2000,
+                        early_exit_ratio=None, early_exit_size=64):
+    """
+    鲁棒估计 dst -> src 的单应性矩阵，返回 (mtx, mask)，失败时 mtx 为 None
+    点对须按匹配质量从高到低排列（PROSAC 依赖该顺序）
+    :param estimator: 'RANSAC' / 'LMEDS' / 'RHO' / 'USAC' / 'MAGSAC' / 'PROSAC' / 'AFFINE'
+    :param early_exit_ratio: 先只用质量最好的 early_exit_size 对匹配估计，
+                             若该结果在全部匹配上的内点比例不低于此值则直接返回，跳过全量估计
+    """
+    if early_exit_ratio is not None and len(dst_pts) > early_exit_size:
+        mtx, _ = _estimate(dst_pts[:early_exit_size], src_pts[:early_exit_size], estimator, threshold,
+                           confidence, max_iters)
+        if mtx is not None:
+            residual = np.linalg.norm(cv2.perspectiveTransform(dst_pts, mtx) - src_pts, axis=2)
+            mask = (residual < threshold).astype(np.uint8)
+            if mask.mean() >= early_exit_ratio:
+                # 用全部内点做一次最小二乘精化，精度与全量估计相当
+                inliers = mask.ravel().astype(bool)
+                refined = _fit_least_squares(dst_pts[inliers], src_pts[inliers], affine=(estimator == 'AFFINE'))
+                return (refined if refined is not None else mtx), mask
+
+    return _estimate(dst_pts, src_pts, estimator, threshold, confidence, max_iters)
+
+
+# GUI 勾选 Early exit 时使用的内点比例
+EARLY_EXIT_RATIO = 0.8
+
+
+def add_registration_args(parser):
+    """命令行脚本（batch_align / export_clips / tracking）共用的配准参数"""
+    parser.add_argument('--estimator', type=str, default='RANSAC', choices=list(ESTIMATORS) + ['AFFINE'],
+                        help='robust homography estimator')
+    parser.add_argument('--early_exit_ratio', type=float, default=None,
+                        help='accept the fit on the best matches when this inlier ratio is reached, e.g. 0.8')
+    parser.add_argument('--prealign', action='store_true',
+                        help='phase-correlation pre-alignment: drop inconsistent matches, skip RANSAC when aligned')
+
+
+def registration_params(args):
+    """命令行参数 -> 传给 register_feature_pts / register_pyramid 的配准参数，只保留非默认值"""
+    params = {}
+    if args.estimator != 'RANSAC':
+        params['estimator'] = args.estimator
+    if args.early_exit_ratio is not None:
+        params['early_exit_ratio'] = args.early_exit_ratio
+    if args.prealign:
+        params['prealign'] = True
+    return params
+
+
+def register_feature_pts(src, dst, method='ORB', min_matches=10, prealign=False, search_radius=20.0,
+                         min_response=0.2, **estimator_params):
+    """
+    基于特征点的配准，返回 RegistrationResult（矩阵及匹配细节，供可视化使用）
+    配准失败时 mtx 为单位矩阵，mask 为 None
+    :param prealign: 先用相位相关估计全局平移，只保留与之相差 search_radius 像素内的匹配；
+                     若剩余匹配经最小二乘拟合后全部满足重投影阈值（已近乎对齐），则跳过 RANSAC
+    :param min_response: 相位相关响应低于此值时不使用预对齐结果
+    :param estimator_params: 传给 estimate_homography 的鲁棒估计参数（estimator, threshold, confidence, ...）
+    """
+    assert src.shape == dst.shape
+    mtx = np.array([[1, 0, 0],
+                    [0, 1, 0],
+                    [0, 0, 1]])
+
+    # 两侧并行检测，已检测过的图像直接命中缓存
+    dst_future = _detect_executor.submit(detect_features, dst, method)
+    kp1, des1 = detect_features(src, method)
+    kp2, des2 = dst_future.result()
+
+    if des1 is None or des2 is None:
+        print("No keypoints detected.")
+        return RegistrationResult(mtx, kp1, kp2, [], None)
+
+    # 特征匹配，按距离排序（PROSAC 和提前终止都依赖匹配质量顺序）
+    good_matches = sorted(match_features(des1, des2, method), key=lambda x: x.distance)
     print(f"找到 {len(good_matches)} 个良好匹配")
 
     if len(good_matches) < min_matches:
         print(f"匹配点数量不足 {min_matches}，无法计算变换矩阵")
-        return mtx
+        return RegistrationResult(mtx, kp1, kp2, good_matches, None)
 
     # 提取匹配点的坐标
     src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
     dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
 
-    # 使用 RANSAC 计算单应性矩阵
-    mtx, mask = cv2.findHomography(dst_pts, src_pts, cv2.RANSAC, 5.0)
+    mtx = None
+    if prealign:
+        prior, response = estimate_phase_shift(src, dst)
+        if response >= min_response:
+            # 缩小匹配范围：剔除与全局平移不一致的匹配
+            predicted = cv2.perspectiveTransform(dst_pts, prior)
+            consistent = np.linalg.norm(predicted - src_pts, axis=2).ravel() < search_radius
+            if np.count_nonzero(consistent) >= min_matches:
+                good_matches = [m for m, ok in zip(good_matches, consistent) if ok]
+                src_pts, dst_pts = src_pts[consistent], dst_pts[consistent]
+
+                lsq_mtx, _ = cv2.findHomography(dst_pts, src_pts, 0)
+                if lsq_mtx is not None:
+                    residual = np.linalg.norm(cv2.perspectiveTransform(dst_pts, lsq_mtx) - src_pts, axis=2)
+                    if residual.max() < estimator_params.get('threshold', 5.0):
+                        print("预对齐后匹配一致，跳过 RANSAC")
+                        mtx, mask = lsq_mtx, np.ones((len(good_matches), 1), dtype=np.uint8)
+
+    # 鲁棒估计单应性矩阵（默认 RANSAC）
+    if mtx is None:
+        mtx, mask = estimate_homography(dst_pts, src_pts, **estimator_params)
+    if mtx is None:
+        print("单应性矩阵估计失败")
+        return RegistrationResult(np.eye(3), kp1, kp2, good_matches, None)
 
     # 统计内点数量
     inlier_count = np.sum(mask)
     print(f"内点数量: {inlier_count}/{len(good_matches)}")
 
-    h, w = dst.shape[:2]
-    registered_img = cv2.warpPerspective(dst, mtx, (w, h))
-    visualize_registration(src, dst, registered_img, kp1, kp2, good_matches, mask)
+    return RegistrationResult(mtx, kp1, kp2, good_matches, mask)
+
+
+def mapping_feature_pts(src, dst, method='ORB', min_matches=10, visualize=VIS_OFF, prealign=False,
+                        **estimator_params):
+    """
+    基于特征点的配准，返回 3*3 透视矩阵（GT -> Low-light）
+    :param visualize: VIS_OFF 不可视化（默认）；
+                      VIS_ARRAY 额外返回诊断图像 (mtx, vis_img)，只用 OpenCV 绘制，可在后台线程调用；
+                      VIS_INTERACTIVE 弹出 matplotlib 窗口（阻塞）
+    :param prealign: 用相位相关预对齐缩小匹配范围，详见 register_feature_pts
+    :param estimator_params: 鲁棒估计参数，详见 estimate_homography
+    """
+    result = register_feature_pts(src, dst, method, min_matches, prealign=prealign, **estimator_params)
+
+    if visualize == VIS_ARRAY:
+        return result.mtx, render_registration(src, dst, result)
+
+    if visualize == VIS_INTERACTIVE and result.mask is not None:
+        show_registration(src, dst, result)
+
+    return result.mtx
+
+
+def downsample(img, levels):
+    """按 2^levels 缩小图像"""
+    scale = 2 ** levels
+    h, w = img.shape[:2]
+    return cv2.resize(img, (max(1, w // scale), max(1, h // scale)), interpolation=cv2.INTER_AREA)
+
+
+def mapping_pyramid(src, dst, method='ORB', min_matches=10, levels=2, refine='ecc'):
+    """
+    由粗到细的金字塔配准：先在 1/2^levels 分辨率上估计单应性矩阵，再在全分辨率上细化
+    :param refine: 'none'     不细化；
+                   'features' 在全分辨率上检测少量 ORB 特征，只保留与粗估计预测位置一致的匹配后重新估计，
+                              仅当细化后的光度残差更小时才采用；
+                   'ecc'      以粗估计为初值，用 ECC 在裁剪图上迭代细化（默认，精度最高）
+    :return: 3*3 透视矩阵（GT -> Low-light）
+    """
+    return register_pyramid(src, dst, method, min_matches, levels, refine).mtx
+
+
+def register_pyramid(src, dst, method='ORB', min_matches=10, levels=2, refine='ecc', **reg_params):
+    """
+    金字塔配准，返回 RegistrationResult：mtx 为细化后的全分辨率矩阵，
+    kp1/kp2/matches/mask 来自粗层配准，关键点坐标已换算到全分辨率（可直接用 render_registration 绘制）
+    粗层配准失败时 mtx 为单位矩阵，mask 为 None
+    :param reg_params: 粗层配准参数，原样传给 register_feature_pts（estimator, early_exit_ratio, ...）
+    """
+    assert src.shape == dst.shape
+    h, w = src.shape[:2]
+    src_small = downsample(src, levels)
+    dst_small = downsample(dst, levels)
+
+    result = register_feature_pts(src_small, dst_small, method, min_matches, **reg_params)
+    sx, sy = w / src_small.shape[1], h / src_small.shape[0]
+    kp1 = _scale_keypoints(result.kp1, sx, sy)
+    kp2 = _scale_keypoints(result.kp2, sx, sy)
+    if result.mask is None:
+        return RegistrationResult(result.mtx, kp1, kp2, result.matches, None)
+
+    # 粗估计映射回全分辨率坐标
+    S = np.diag([sx, sy, 1.0])
+    mtx = S @ result.mtx @ np.linalg.inv(S)
+
+    if refine == 'features':
+        refined = refine_homography_features(src, dst, mtx, min_matches, radius=2.0 * 2 ** levels)
+        # 全分辨率 ORB 匹配在噪声图上定位不准，细化结果可能比粗估计更差
+        if alignment_residual(src, dst, refined) < alignment_residual(src, dst, mtx):
+            mtx = refined
+    elif refine == 'ecc':
+        mtx = refine_homography_ecc(src, dst, mtx)
+    return RegistrationResult(mtx, kp1, kp2, result.matches, result.mask)
+
+
+def _scale_keypoints(keypoints, sx, sy):
+    """把关键点坐标缩放到另一分辨率（返回新的 KeyPoint，不修改特征缓存中的对象）"""
+    if keypoints is None:
+        return keypoints
+    return [cv2.KeyPoint(kp.pt[0] * sx, kp.pt[1] * sy, kp.size * sx, kp.angle, kp.response, kp.octave, kp.class_id)
+            for kp in keypoints]
+
+
+def refine_homography_features(src, dst, mtx, min_matches=10, radius=8.0, nfeatures=1000):
+    """用全分辨率 ORB 特征细化单应性矩阵，只接受落在粗估计预测位置 radius 像素内的匹配"""
+    detectors = _thread_pool.__dict__.setdefault("detectors", {})
+    if 'ORB_refine' not in detectors:
+        detectors['ORB_refine'] = cv2.ORB_create(nfeatures=nfeatures)
+    detector = detectors['ORB_refine']
+
+    kp1, des1 = detector.detectAndCompute(cv2.cvtColor(src, cv2.COLOR_BGR2GRAY), None)
+    kp2, des2 = detector.detectAndCompute(cv2.cvtColor(dst, cv2.COLOR_BGR2GRAY), None)
+    if des1 is None or des2 is None:
+        return mtx
+
+    matches = get_matcher('ORB').match(des1, des2)
+    if len(matches) < min_matches:
+        return mtx
+
+    src_pts = np.float32([kp1[m.queryIdx].pt for m in matches]).reshape(-1, 1, 2)
+    dst_pts = np.float32([kp2[m.trainIdx].pt for m in matches]).reshape(-1, 1, 2)
+
+    # 粗估计预测的位置与实际匹配位置的偏差
+    predicted = cv2.perspectiveTransform(dst_pts, mtx)
+    consistent = np.linalg.norm(predicted - src_pts, axis=2).ravel() < radius
+    if np.count_nonzero(consistent) < min_matches:
+        return mtx
+
+    refined, _ = estimate_homography(dst_pts[consistent], src_pts[consistent], threshold=3.0)
+    return refined if refined is not None else mtx
+
+
+def alignment_residual(src, dst, mtx, levels=2):
+    """在 1/2^levels 分辨率上按 mtx 变换 dst 后与 src 的平均灰度差（只统计变换后有效的区域）"""
+    src_small = downsample(src, levels)
+    dst_small = downsample(dst, levels)
+    S = np.diag([src.shape[1] / src_small.shape[1], src.shape[0] / src_small.shape[0], 1.0])
+    mtx_small = np.linalg.inv(S) @ mtx @ S
+    h, w = src_small.shape[:2]
+    src_gray = cv2.cvtColor(src_small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    warped = cv2.warpPerspective(cv2.cvtColor(dst_small, cv2.COLOR_BGR2GRAY).astype(np.float32), mtx_small, (w, h))
+    valid = cv2.warpPerspective(np.ones((h, w), np.uint8), mtx_small, (w, h), flags=cv2.INTER_NEAREST) > 0
+    if not valid.any():
+        return float('inf')
+    return float(np.mean(np.abs(src_gray[valid] - warped[valid])))
+
+
+def refine_homography_ecc(src, dst, mtx, iterations=30, eps=1e-5, levels=1):
+    """
+    以 mtx 为初值用 ECC 细化（ECC 的变换方向为 src -> dst，需取逆）
+    ECC 在 1/2^levels 分辨率上迭代，以控制全分辨率裁剪图上的耗时
+    """
+    src_small = downsample(src, levels)
+    dst_small = downsample(dst, levels)
+    S = np.diag([src.shape[1] / src_small.shape[1], src.shape[0] / src_small.shape[0], 1.0])
+    S_inv = np.linalg.inv(S)
+
+    src_gray = cv2.cvtColor(src_small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    dst_gray = cv2.cvtColor(dst_small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    warp = (S_inv @ np.linalg.inv(mtx) @ S).astype(np.float32)
+    warp /= warp[2, 2]
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, iterations, eps)
+    try:
+        _, warp = cv2.findTransformECC(src_gray, dst_gray, warp, cv2.MOTION_HOMOGRAPHY, criteria, None, 5)
+    except cv2.error as e:
+        print(f"ECC 未收敛，保留粗估计: {e}")
+        return mtx
+
+    refined = S @ np.linalg.inv(warp.astype(np.float64)) @ S_inv
+    return refined / refined[2, 2]
 
-    return mtx
+
+def homography_corner_error(mtx1, mtx2, shape):
+    """两个单应性矩阵对图像四角映射结果的平均距离（像素）"""
+    h, w = shape[:2]
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    pts1 = cv2.perspectiveTransform(corners, np.asarray(mtx1, dtype=np.float64))
+    pts2 = cv2.perspectiveTransform(corners, np.asarray(mtx2, dtype=np.float64))
+    return float(np.mean(np.linalg.norm(pts1 - pts2, axis=2)))
+
+
+def compare_pyramid_registration(src, dst, method='ORB', min_matches=10, levels=2, refine='ecc', gt_mtx=None):
+    """
+    比较单尺度与金字塔配准的耗时和精度
+    精度以四角映射误差衡量：给定 gt_mtx 时与真值比较，否则以单尺度结果为参考
+    """
+    clear_feature_cache()
+    t0 = time.perf_counter()
+    mtx_single = mapping_feature_pts(src, dst, method, min_matches)
+    t1 = time.perf_counter()
+    clear_feature_cache()
+    mtx_pyramid = mapping_pyramid(src, dst, method, min_matches, levels, refine)
+    t2 = time.perf_counter()
+
+    report = {
+        "single_ms": (t1 - t0) * 1000,
+        "pyramid_ms": (t2 - t1) * 1000,
+        "speedup": (t1 - t0) / max(t2 - t1, 1e-9),
+        "pyramid_vs_single_px": homography_corner_error(mtx_pyramid, mtx_single, src.shape),
+    }
+    if gt_mtx is not None:
+        report["single_error_px"] = homography_corner_error(mtx_single, gt_mtx, src.shape)
+        report["pyramid_error_px"] = homography_corner_error(mtx_pyramid, gt_mtx, src.shape)
+
+    print(", ".join(f"{k}: {v:.2f}" for k, v in report.items()))
+    return report
+
+
+def render_registration(img1, img2, result, scale=0.5):
+    """
+    将配准诊断绘制为一幅 BGR 图像（不依赖 matplotlib，可在后台线程调用）
+    布局：第一行 参考图像 | 待配准图像；第二行 配准后的图像 | 叠加对比；第三行 特征匹配
+    """
+    h, w = img2.shape[:2]
+    registered_img = cv2.warpPerspective(img2, np.asarray(result.mtx, dtype=np.float64), (w, h))
+    blended = cv2.addWeighted(img1, 0.5, registered_img, 0.5, 0)
+
+    panel_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    panels = []
+    for img, title in ((img1, "Reference"), (img2, "Moving"),
+                       (registered_img, "Registered"), (blended, "Overlay")):
+        panel = cv2.resize(img, panel_size, interpolation=cv2.INTER_AREA)
+        cv2.putText(panel, title, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2)
+        panels.append(panel)
+
+    # 特征匹配可视化
+    matches_mask = result.mask.ravel().tolist() if result.mask is not None else None
+    img_matches = cv2.drawMatches(img1, result.kp1, img2, result.kp2, result.matches, None,
+                                  matchColor=(0, 255, 0), singlePointColor=None,
+                                  matchesMask=matches_mask, flags=2)
+    img_matches = cv2.resize(img_matches, (panel_size[0] * 2, panel_size[1]), interpolation=cv2.INTER_AREA)
+    inlier_count = int(np.sum(result.mask)) if result.mask is not None else 0
+    cv2.putText(img_matches, f"Matches: {inlier_count}/{len(result.matches)} inliers", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2)
+
+    return np.vstack([np.hstack(panels[:2]), np.hstack(panels[2:]), img_matches])
+
+
+def show_registration(src, dst, result):
+    """用配准结果中的矩阵变换正常光图像，弹出 matplotlib 窗口（阻塞，只能在主线程调用）"""
+    h, w = src.shape[:2]
+    registered_img = cv2.warpPerspective(dst, result.mtx, (w, h))
+    visualize_registration(src, dst, registered_img, result.kp1, result.kp2, result.matches, result.mask)
 
 
 def visualize_registration(img1, img2, registered_img, kp1, kp2, matches, mask):
@@ -138,11 +628,15 @@ if __name__ == '__main__':
     src = cv2.imread(r"/home/ub24017/MyCodes/AutoCropTool/data/001_014/low_light_cropped.png")
     dst = cv2.imread(r"/home/ub24017/MyCodes/AutoCropTool/data/001_014/normal_light_cropped.png")
 
-    mtx = mapping_feature_pts(src, dst, "ORB")
+    mtx = mapping_feature_pts(src, dst, "ORB", visualize=VIS_INTERACTIVE)
     # 应用透视变换
 
     h, w = dst.shape[:2]
     registered_img = cv2.warpPerspective(dst, mtx, (w, h))
     overlay = cv2.addWeighted(src, 0.5, registered_img, 0.5, 0)
 
+    # 单尺度与金字塔配准的耗时、精度对比
+    compare_pyramid_registration(src, dst, "ORB", levels=2, refine='features')
+    compare_pyramid_registration(src, dst, "ORB", levels=2, refine='ecc')
+
     pass
\ No newline at end of file
@@ -0,0 +1,118 @@
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_cache import load_frame
+
+
+class SharedFrameRing:
+    """
+    基于 multiprocessing.shared_memory 的帧环形缓冲区，用于进程间零拷贝传递解码后的帧：
+    - 共享内存划分为 num_slots 个固定大小的槽，每个槽可顺序存放多张图像（如低光/正常光帧对）
+    - free 队列保存空闲槽号，filled 队列保存 (槽号, 元数据)；生产者取不到空闲槽时阻塞，形成反压
+    - 消费者处理完后 release 槽号，槽被回收复用
+    对象可作为 Process 参数传入子进程，子进程中按名字重新挂载同一块共享内存
+    """
+
+    def __init__(self, num_slots, slot_bytes, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.num_slots = num_slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_bytes)
+        self.free = ctx.Queue()
+        self.filled = ctx.Queue()
+        for slot in range(num_slots):
+            self.free.put(slot)
+        # fork 启动的子进程会直接继承该对象，按进程号区分创建者
+        self._owner_pid = os.getpid()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["shm"] = self.shm.name
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=state["shm"])
+
+    def acquire(self, timeout=None):
+        """取一个空闲槽号，全部槽都在使用中时阻塞（反压）"""
+        return self.free.get(timeout=timeout)
+
+    def publish(self, slot, meta=None):
+        """写完槽后交给消费者"""
+        self.filled.put((slot, meta))
+
+    def get(self, timeout=None):
+        """取一个已写入的槽，返回 (槽号, 元数据)；收到结束标记时返回 (None, None)"""
+        item = self.filled.get(timeout=timeout)
+        return (None, None) if item is None else item
+
+    def release(self, slot):
+        """消费者用完后归还槽号"""
+        self.free.put(slot)
+
+    def stop(self, num_consumers=1):
+        """通知消费者退出"""
+        for _ in range(num_consumers):
+            self.filled.put(None)
+
+    def views(self, slot, shapes, dtype=np.uint8):
+        """返回槽内按 shapes 顺序紧密排列的图像视图（不拷贝）"""
+        arrays = []
+        offset = slot * self.slot_bytes
+        for shape in shapes:
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            if offset + nbytes > (slot + 1) * self.slot_bytes:
+                raise ValueError(f"Frames {shapes} exceed slot size {self.slot_bytes}")
+            arrays.append(np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset))
+            offset += nbytes
+        return arrays
+
+    def write(self, slot, images):
+        """把图像依次拷贝进槽，返回各自的 shape（读取端据此重建视图）"""
+        shapes = [image.shape for image in images]
+        for view, image in zip(self.views(slot, shapes, images[0].dtype), images):
+            view[...] = image
+        return shapes
+
+    def close(self):
+        """释放本进程的映射；创建者同时删除共享内存"""
+        self.shm.close()
+        if os.getpid() == self._owner_pid:
+            self.shm.unlink()
+
+
+def slot_bytes_for(images):
+    """容纳一组图像所需的槽大小"""
+    return sum(image.nbytes for image in images)
+
+
+def decode_worker(ring, task_queue, load_fn=load_frame):
+    """
+    解码进程：从 task_queue 取 (key, 路径列表)，解码后写入同一个槽并发布，
+    元数据为 (key, shapes, error)；收到 None 时退出
+    路径列表通常来自 frame_cache.list_image_files，与 Canvas 中的帧序号一致
+    """
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        key, paths = task
+
+        images = [load_fn(path) for path in paths]
+        missing = [path for path, image in zip(paths, images) if image is None]
+        # 先解码再取槽：解码期间不占用槽，槽只在等待消费时被占用
+        slot = ring.acquire()
+        if missing:
+            ring.publish(slot, (key, None, f"Failed to read {', '.join(missing)}"))
+            continue
+        try:
+            shapes = ring.write(slot, images)
+        except ValueError as e:
+            ring.publish(slot, (key, None, str(e)))
+            continue
+        ring.publish(slot, (key, shapes, None))
+    ring.close()
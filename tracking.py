@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Temporal homography tracking:
+Detects features once, propagates them frame-to-frame with pyramidal
+Lucas-Kanade optical flow and re-detects only when the inlier count drops.
+Writes one homography (GT -> Low-light, full-frame coordinates) per frame.
+"""
+
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+from clips import load_clip, clip_frame_paths, interpolate_rect
+from map_method import register_feature_pts, estimate_homography, add_registration_args, registration_params
+
+
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+
+
+def offset_matrix(x, y):
+    return np.array([[1, 0, x],
+                     [0, 1, y],
+                     [0, 0, 1]], dtype=np.float64)
+
+
+def detect_in_rect(noisy, gt, rect, method='ORB', reg_params=None):
+    """
+    在裁剪区域内做特征匹配，返回 (全图坐标下的单应性矩阵, 低光内点, GT 内点)
+    失败时返回 (None, None, None)
+    """
+    x, y, w, h = rect
+    src = noisy[y:y + h, x:x + w]
+    dst = gt[y:y + h, x:x + w]
+    result = register_feature_pts(src, dst, method, **(reg_params or {}))
+    if result.mask is None:
+        return None, None, None
+
+    inliers = result.mask.ravel().astype(bool)
+    matches = [m for m, ok in zip(result.matches, inliers) if ok]
+    pts_noisy = np.float32([result.kp1[m.queryIdx].pt for m in matches]).reshape(-1, 1, 2) + (x, y)
+    pts_gt = np.float32([result.kp2[m.trainIdx].pt for m in matches]).reshape(-1, 1, 2) + (x, y)
+
+    mtx = offset_matrix(x, y) @ result.mtx @ offset_matrix(-x, -y)
+    return mtx, pts_noisy.astype(np.float32), pts_gt.astype(np.float32)
+
+
+def propagate(prev_gray, gray, pts):
+    """金字塔 LK 光流传播特征点，返回 (新位置, 是否成功)，带前后向一致性检查"""
+    nxt, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, pts, None, **LK_PARAMS)
+    back, status_back, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, nxt, None, **LK_PARAMS)
+    fb_error = np.linalg.norm(back - pts, axis=2).ravel()
+    ok = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < 1.0)
+    return nxt, ok
+
+
+def track_clip(clip, out_path, method='ORB', min_inliers=50, gate=10.0, reg_params=None):
+    """
+    逐帧跟踪一个剪辑的单应性矩阵并写入 JSON lines 轨迹文件
+    :param min_inliers: 跟踪内点数低于此值时重新检测特征
+    :param gate: 与前一帧单应性预测位置的最大偏差（像素），超出的点对在估计前剔除
+    :param reg_params: 配准参数，重新检测和跟踪点的单应性估计都使用其中的 estimator / early_exit_ratio
+    """
+    reg_params = reg_params or {}
+    noisy_paths, gt_paths = clip_frame_paths(clip)
+    start_frm, end_frm = clip["start_frm"], clip["end_frm"]
+    end_frm = min(end_frm, len(noisy_paths) - 1, len(gt_paths) - 1)
+
+    prev_noisy_gray = prev_gt_gray = None
+    pts_noisy = pts_gt = None
+    prev_mtx = np.eye(3)
+    redetect_count = 0
+
+    with open(out_path, 'w') as output_file:
+        for frm_idx in range(start_frm, end_frm + 1):
+            noisy = cv2.imread(noisy_paths[frm_idx])
+            gt = cv2.imread(gt_paths[frm_idx])
+            if noisy is None or gt is None:
+                print(f"Failed to read frame {frm_idx}, skipping.")
+                continue
+            noisy_gray = cv2.cvtColor(noisy, cv2.COLOR_BGR2GRAY)
+            gt_gray = cv2.cvtColor(gt, cv2.COLOR_BGR2GRAY)
+            rect = interpolate_rect(clip, frm_idx)
+
+            mtx, inlier_count, redetected = None, 0, False
+            if pts_noisy is not None and len(pts_noisy) >= min_inliers:
+                # 两路特征点分别在各自序列中逐帧传播
+                nxt_noisy, ok_noisy = propagate(prev_noisy_gray, noisy_gray, pts_noisy)
+                nxt_gt, ok_gt = propagate(prev_gt_gray, gt_gray, pts_gt)
+                ok = ok_noisy & ok_gt
+                pts_noisy, pts_gt = nxt_noisy[ok], nxt_gt[ok]
+
+                # 以前一帧单应性为种子，剔除与其预测偏差过大的点对
+                if len(pts_gt) >= 4:
+                    predicted = cv2.perspectiveTransform(pts_gt, prev_mtx)
+                    keep = np.linalg.norm(predicted - pts_noisy, axis=2).ravel() < gate
+                    pts_noisy, pts_gt = pts_noisy[keep], pts_gt[keep]
+
+                if len(pts_gt) >= 4:
+                    mtx, mask = estimate_homography(pts_gt, pts_noisy, reg_params.get('estimator', 'RANSAC'), 3.0,
+                                                    early_exit_ratio=reg_params.get('early_exit_ratio'))
+                    if mtx is not None:
+                        inliers = mask.ravel().astype(bool)
+                        pts_noisy, pts_gt = pts_noisy[inliers], pts_gt[inliers]
+                        inlier_count = int(np.count_nonzero(inliers))
+
+            if mtx is None or inlier_count < min_inliers:
+                # 跟踪点不足，在当前裁剪框内重新检测
+                det_mtx, det_noisy, det_gt = detect_in_rect(noisy, gt, rect, method, reg_params)
+                redetected = True
+                redetect_count += 1
+                if det_mtx is not None:
+                    mtx, pts_noisy, pts_gt = det_mtx, det_noisy, det_gt
+                    inlier_count = len(pts_noisy)
+                elif mtx is None:
+                    # 检测也失败时沿用前一帧的估计
+                    mtx, pts_noisy, pts_gt = prev_mtx, None, None
+                    inlier_count = 0
+
+            record = {"frame": frm_idx,
+                      "mtx": mtx.tolist(),
+                      "inliers": inlier_count,
+                      "redetected": redetected,
+                      "crop_rect": rect,
+                      "noisy_path": noisy_paths[frm_idx],
+                      "gt_path": gt_paths[frm_idx]}
+            output_file.write(json.dumps(record) + "\n")
+
+            prev_noisy_gray, prev_gt_gray, prev_mtx = noisy_gray, gt_gray, mtx
+            print(f"Frame {frm_idx}: {inlier_count} inliers{' (re-detected)' if redetected else ''}")
+
+    print(f"Tracked {end_frm - start_frm + 1} frames, {redetect_count} re-detections -> {out_path}")
+    return out_path
+
+
+def default_track_path(clip_path):
+    stem, _ = os.path.splitext(clip_path)
+    return stem + "_homography_track.jsonl"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Homography tracking")
+    parser.add_argument('clip_json', type=str)
+    parser.add_argument('--out', type=str, default=None)
+    parser.add_argument('--method', type=str, default='ORB')
+    parser.add_argument('--min_inliers', type=int, default=50)
+    parser.add_argument('--gate', type=float, default=10.0)
+    add_registration_args(parser)
+    args = parser.parse_args()
+
+    clip = load_clip(args.clip_json)
+    out_path = args.out or default_track_path(args.clip_json)
+    track_clip(clip, out_path, args.method, args.min_inliers, args.gate, registration_params(args))
@@ -6,7 +6,10 @@ using Catmull-Rom interpolation.
 """
 
 import os
+import json
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import argparse
 import csv
@@ -22,16 +25,50 @@ parser.add_argument('--out_dir', type=str, default=r"")
 parser.add_argument('--iso', default=800, type=int)
 parser.add_argument('--REDLINE_CMD', type=str, default='REDline')
 parser.add_argument('--fps', type=int, default=25)
+parser.add_argument('--jobs', type=int, default=16, help='concurrent --printMeta processes')
 
-args = parser.parse_args()
+# parse_known_args：被其他脚本（如 bench_redline.py）导入时不因对方的命令行参数报错
+args, _ = parser.parse_known_args()
 
 # ========== 功能函数 ==========
 
-def process_r3d_file(r3d_path: Path):
-    """调用 REDline 处理单个 R3D 文件"""
+# Abs TC 缓存文件（与 Abs_TC.txt 同目录），按 R3D 路径 + 大小 + 修改时间命中
+TC_CACHE_FILE_NAME = "abs_tc_cache.json"
+
+_cache_lock = threading.Lock()
+
+
+def load_tc_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_tc_cache(cache_path, cache):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, cache_path)
+
+
+def process_r3d_file(r3d_path: Path, cache=None):
+    """调用 REDline --printMeta 读取单个 R3D 文件的 Abs TC，读到后立即结束进程"""
     basename = r3d_path.name
     Abs_TC = None
 
+    stat = r3d_path.stat()
+    cache_key = str(r3d_path.resolve())
+    if cache is not None:
+        with _cache_lock:
+            entry = cache.get(cache_key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            print(f"Cached: {basename} {entry['Abs_TC']}")
+            return entry["Abs_TC"]
+
     # # 输出文件名前缀
     # out_prefix = str(out_dir / "frame_")
 
@@ -47,19 +84,28 @@ def process_r3d_file(r3d_path: Path):
     print("Command:", " ".join(cmd))
 
     try:
-        results = subprocess.run(cmd, capture_output=True, text=True)
-        for line in results.stdout.splitlines():
-            if line.strip().startswith("Abs TC"):
-                print(f"Abs TC: {line}")
-                Abs_TC = line
-    except subprocess.CalledProcessError as e:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError as e:
         print(e)
-
+        return Abs_TC
+
+    # 逐行读取，Abs TC 之后的元数据不再需要
+    for line in proc.stdout:
+        if line.strip().startswith("Abs TC"):
+            Abs_TC = line.strip()
+            print(f"Abs TC: {Abs_TC}")
+            break
+    proc.terminate()
+    proc.wait()
+
+    if Abs_TC is not None and cache is not None:
+        with _cache_lock:
+            cache[cache_key] = {"size": stat.st_size, "mtime": stat.st_mtime, "Abs_TC": Abs_TC}
     return Abs_TC
 
 
 def batch_process():
-    """批量处理输入文件夹中的所有 R3D 文件"""
+    """并发读取输入文件夹中每段素材的 Abs TC，按素材顺序写入 Abs_TC.txt"""
     input_dir = Path(args.input_dir)
     if not input_dir.exists():
         raise FileNotFoundError(f"Input path doesn't exist: {input_dir}")
@@ -68,29 +114,54 @@ def batch_process():
         print("No .RDC file found.")
         return
 
-
-    #  文件
-    save_path = os.path.join(args.out_dir, 'Abs_TC.txt')
-    output_file = open(save_path, 'w')
-
+    r3d_files = []
     for video_folder in video_folders:
         video_path = Path(video_folder)
-        r3d_files = sorted(video_path.glob("*.R3D"))
-        if not r3d_files:
-            print("No .R3D file found.")
-            return
-
-        print(f"Find {len(r3d_files)} R3D Files")
-        text_line = process_r3d_file(r3d_files[0])
-
-        output_file.write(text_line)
-        output_file.write("\n")
+        video_r3d_files = sorted(video_path.glob("*.R3D"))
+        if not video_r3d_files:
+            print(f"No .R3D file found in {video_path}.")
+            continue
+        # 分段素材的 Abs TC 取第一段
+        r3d_files.append(video_r3d_files[0])
+    print(f"Find {len(r3d_files)} R3D Files")
 
-    output_file.close()
+    cache_path = os.path.join(args.out_dir, TC_CACHE_FILE_NAME)
+    cache = load_tc_cache(cache_path)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(args.jobs, len(r3d_files)))) as executor:
+            # map 按提交顺序返回结果，输出顺序与素材顺序一致
+            text_lines = list(executor.map(lambda f: process_r3d_file(f, cache), r3d_files))
+    finally:
+        # 某个素材出错或被中断时，已读到的 Abs TC 也要保存，续跑时不必重新读取
+        with _cache_lock:
+            save_tc_cache(cache_path, cache)
 
+    #  文件
+    save_path = os.path.join(args.out_dir, 'Abs_TC.txt')
+    with open(save_path, 'w') as output_file:
+        for r3d_file, text_line in zip(r3d_files, text_lines):
+            if text_line is None:
+                # 保留空行，使每行与素材顺序一一对应；compute_offset 会跳过该素材
+                print(f"Abs TC not found: {r3d_file}")
+                text_line = ""
+            output_file.write(text_line)
+            output_file.write("\n")
+
+
+def parse_tc(line):
+    """解析 Abs_TC.txt 中的一行，返回 [MM, SS, FF]；没有读到 Abs TC（空行）或格式不对时返回 None"""
+    try:
+        tc = [int(x) for x in line.split(':')[-3:]]
+    except ValueError:
+        return None
+    return tc if len(tc) == 3 else None
 
 
 def compute_offset(normal_file, low_file):
+    """
+    按两台机位的 Abs TC 计算每段素材的帧偏移，写入 Offset_TC_004.txt
+    任一机位缺少 Abs TC 的素材写 "-\t-"（保留该行以免后续素材错位），重命名时跳过
+    """
     output_path = os.path.join(args.out_dir, 'Offset_TC_004.txt')
     output_file = open(output_path, 'w')
     output_file.write("Normal_offset\tLow_offset\n")
@@ -108,8 +179,12 @@ def compute_offset(normal_file, low_file):
     for idx in range(len(normal_lines)):
         normal_line = normal_lines[idx]
         low_line = low_lines[idx]
-        normal_list = [int(x) for x in normal_line.split(':')[-3:]]
-        low_list = [int(x) for x in low_line.split(':')[-3:]]
+        normal_list = parse_tc(normal_line)
+        low_list = parse_tc(low_line)
+        if normal_list is None or low_list is None:
+            print(f"Abs TC missing for clip {idx + 1}, offset not computed")
+            output_file.write("-\t-\n")
+            continue
 
         # compute offset
         diff_list = list(np.array(normal_list) - np.array(low_list))
@@ -138,13 +213,17 @@ def select_frms():
     offsets = []
     for line in offset_lines[1:]:
         offset = line.strip().split("\t")
-        offsets.append([int(x) for x in offset])
+        # 缺少 Abs TC 的素材记为 "-"，占位保持行号与素材顺序对应
+        offsets.append(None if "-" in offset else [int(x) for x in offset])
 
     normal_videos = os.listdir(normal_dir)
     normal_videos.sort()
     low_videos = os.listdir(low_dir)
     low_videos.sort()
     for idx in range(len(offsets)):
+        if offsets[idx] is None:
+            print(f"Skipping clip {idx + 1}: Abs TC missing")
+            continue
         normal_offset, low_offset = offsets[idx]
         save_path = os.path.join(save_dir, str(normal_dir)[-3:]+"_"+str(idx+1).zfill(3))
         print(save_path)
@@ -6,7 +6,14 @@ using Catmull-Rom interpolation.
 """
 
 import os
+import re
+import csv
+import json
+import time
 import subprocess
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import argparse
 import cv2
@@ -19,13 +26,179 @@ parser.add_argument('--input_dir', type=str, default=r"")
 parser.add_argument('--out_dir', type=str, default=r"")
 parser.add_argument('--iso', default=800, type=int)
 parser.add_argument('--REDLINE_CMD', type=str, default='REDline')
+parser.add_argument('--jobs', type=int, default=None, help='concurrent REDline processes, default from core count')
+parser.add_argument('--decode_threads', type=int, default=None, help='--decodeThreads per job, default from core count')
+parser.add_argument('--progress_interval', type=float, default=10.0, help='seconds between per-job progress lines')
 
-args = parser.parse_args()
+# parse_known_args：被其他脚本（如 bench_redline.py）导入时不因对方的命令行参数报错
+args, _ = parser.parse_known_args()
+
+# 单个 REDline 进程解码线程数的上限，再多收益不明显，不如多开几个进程
+MAX_DECODE_THREADS = 8
+
+# 每个输出根目录一个任务清单，用于中断后续跑
+MANIFEST_FILE_NAME = "redline_manifest.json"
+
+# REDline 的进度行（整行为 "Processed frame 120/2400"），只用来更新进度，不逐行打印
+PROGRESS_RE = re.compile(r"Processed frame (\d+)/(\d+)")
+
+SUMMARY_FIELDS = ["clip", "r3d_path", "status", "frames", "expected_frames", "bytes", "wall_s", "fps",
+                  "decode_threads"]
+
+_print_lock = threading.Lock()
+_manifests = {}
+_manifests_lock = threading.Lock()
 
 # ========== 功能函数 ==========
 
-def process_r3d_file(r3d_path: Path, output_dir, ISO, is_flip=False):
-    """调用 REDline 处理单个 R3D 文件"""
+def log(tag, msg):
+    """多个任务并发输出时按行加锁，并加上任务前缀"""
+    with _print_lock:
+        print(f"[{tag}] {msg}", flush=True)
+
+
+def plan_concurrency(jobs=None, decode_threads=None, num_files=None):
+    """
+    根据 CPU 核数确定并发任务数和每个任务的解码线程数：
+    两者都未指定时每个任务 MAX_DECODE_THREADS 个线程，任务数 = 核数 / 线程数；
+    只指定其一时另一个按核数均分
+    """
+    cores = os.cpu_count() or 1
+    if jobs is None and decode_threads is None:
+        decode_threads = min(MAX_DECODE_THREADS, cores)
+    if jobs is None:
+        jobs = max(1, cores // decode_threads)
+    if decode_threads is None:
+        decode_threads = max(1, cores // jobs)
+    if num_files is not None:
+        jobs = max(1, min(jobs, num_files))
+    return jobs, decode_threads
+
+
+class JobManifest:
+    """
+    输出根目录下的转换任务清单 redline_manifest.json，按素材名（输出子目录名）记录：
+    R3D 路径、大小、修改时间、REDline 参数、预期帧数、已输出帧数、状态（running / done / failed）
+    以及第 2 步重命名时使用的偏移（renamed_offset，未重命名时为 None）
+    每次更新都先写临时文件再替换，中断时不会留下半个 JSON
+    """
+
+    def __init__(self, output_dir):
+        self.path = Path(output_dir) / MANIFEST_FILE_NAME
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ignoring broken manifest {self.path}: {e}")
+
+    def get(self, name):
+        with self._lock:
+            return dict(self.entries.get(name, {}))
+
+    def update(self, name, **fields):
+        with self._lock:
+            self.entries.setdefault(name, {}).update(fields)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def get_manifest(output_dir):
+    """同一输出根目录的并发任务共享一个清单对象"""
+    key = os.path.abspath(output_dir)
+    with _manifests_lock:
+        if key not in _manifests:
+            Path(key).mkdir(parents=True, exist_ok=True)
+            _manifests[key] = JobManifest(key)
+        return _manifests[key]
+
+
+def list_frames(out_dir):
+    """输出目录中已有的 TIFF 帧"""
+    if not os.path.isdir(out_dir):
+        return []
+    return [entry.path for entry in os.scandir(out_dir) if entry.name.endswith(".tif")]
+
+
+def probe_total_frames(r3d_path):
+    """用 --printMeta 读取素材总帧数，读到 Total Frames 行后立即结束进程；读不到时返回 None"""
+    cmd = [args.REDLINE_CMD, "--i", str(r3d_path), "--printMeta", "1"]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return None
+
+    total_frames = None
+    for line in proc.stdout:
+        if line.strip().startswith("Total Frames"):
+            try:
+                total_frames = int(line.split(":")[-1])
+            except ValueError:
+                pass
+            break
+    proc.terminate()
+    proc.wait()
+    return total_frames
+
+
+def dir_size(out_dir):
+    """输出目录中 TIFF 帧的数量和总字节数"""
+    frames = list_frames(out_dir)
+    return len(frames), sum(os.path.getsize(frame_path) for frame_path in frames)
+
+
+def monitor_progress(tag, out_dir, progress, stop_event, interval):
+    """
+    监控线程：定期统计输出目录中的帧数和字节数，打印解码速度、写入速度和剩余时间
+    progress 中的 expected_frames 可能由 REDline 输出的进度行更新
+    """
+    t0 = time.perf_counter()
+    while not stop_event.wait(interval):
+        frames, nbytes = dir_size(out_dir)
+        elapsed = time.perf_counter() - t0
+        fps = frames / elapsed
+        msg = f"{frames} frames, {fps:.2f} fps, {nbytes / 1024 ** 2 / elapsed:.1f} MB/s"
+        expected_frames = progress.get("expected_frames")
+        if expected_frames and fps > 0:
+            eta = max(0, expected_frames - frames) / fps
+            msg = f"{frames}/{expected_frames} frames, {fps:.2f} fps, " \
+                  f"{nbytes / 1024 ** 2 / elapsed:.1f} MB/s, ETA {eta / 60:.1f} min"
+        log(tag, msg)
+
+
+def check_job(entry, r3d_path, redline_args, out_dir):
+    """对照清单判断任务是否已完成，返回需要重新转换的原因，已完成时返回 None"""
+    if not entry:
+        return "new"
+    stat = r3d_path.stat()
+    if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime:
+        return "input changed"
+    if entry.get("args") != redline_args:
+        return "arguments changed"
+    if entry.get("status") != "done":
+        return f"previous run {entry.get('status')}"
+    # 已完成任务的帧数变化（如第 2 步按偏移重命名后少了 offset 帧）不触发重新转换，避免删掉已处理的帧
+    return None
+
+
+def expected_frames_on_disk(entry):
+    """已完成任务当前应有的帧数：REDline 输出的帧数减去重命名时丢弃的偏移帧"""
+    return max(0, entry["produced_frames"] - (entry.get("renamed_offset") or 0))
+
+
+def failed_stats(r3d_path: Path, decode_threads):
+    """任务统计信息的初始值（状态为 failed，成功或跳过时再更新）"""
+    basename = "_".join(r3d_path.stem.split("_")[:-1])
+    return dict(clip=basename, r3d_path=str(r3d_path), status="failed", frames=0, expected_frames=None, bytes=0,
+                wall_s=0.0, fps=0.0, decode_threads=decode_threads)
+
+
+def process_r3d_file(r3d_path: Path, output_dir, ISO, is_flip=False, decode_threads=8):
+    """调用 REDline 处理单个 R3D 文件，实时输出带任务前缀的日志和进度，返回本任务的统计信息"""
     basename = r3d_path.stem
     basename = "_".join(basename.split("_")[:-1])
     out_dir = Path(output_dir) / basename
@@ -45,21 +218,94 @@ def process_r3d_file(r3d_path: Path, output_dir, ISO, is_flip=False):
         "--resizeX", "4096",            # 下采样 1/2
         "--resizeY", "2160",            # 下采样 1/2
         "--filter", "5",              # Catmull-Rom
-        "--decodeThreads", "8",    # 全质量解码
+        "--decodeThreads", str(decode_threads),    # 全质量解码
         # "--useRMD", "1",              # 使用相机元数据
         # "--pipeline", "PrimaryDevelopment"  # 只做 debayer，不做 IPP2 处理
         # "--frameCount", "60",
         "--forceFlipHorizontal", str(int(is_flip))
     ]
 
-    print(f"Processing: {r3d_path.name}")
-    print("Command:", " ".join(cmd))
-
+    tag = r3d_path.stem
+    stats = failed_stats(r3d_path, decode_threads)
+    manifest = get_manifest(output_dir)
+    # 只比较影响输出的转换参数：去掉命令名、输入输出路径和解码线程数
+    redline_args = cmd[5:]
+    thread_idx = redline_args.index("--decodeThreads")
+    redline_args = redline_args[:thread_idx] + redline_args[thread_idx + 2:]
+    entry = manifest.get(basename)
+    reason = check_job(entry, r3d_path, redline_args, out_dir)
+    if reason is None:
+        log(tag, f"Skipping {r3d_path.name}: already converted")
+        frames_on_disk = len(list_frames(out_dir))
+        if frames_on_disk != expected_frames_on_disk(entry):
+            log(tag, f"Warning: {frames_on_disk} frames on disk, expected {expected_frames_on_disk(entry)}; "
+                     f"remove {basename} from {manifest.path} to convert it again")
+        stats.update(status="skipped", frames=entry["produced_frames"], expected_frames=entry["expected_frames"],
+                     bytes=dir_size(out_dir)[1])
+        return stats
+
+    # 未完成或需要重做的任务：先清掉旧帧，避免残留多余的帧
+    stale_frames = list_frames(out_dir)
+    if stale_frames:
+        log(tag, f"Removing {len(stale_frames)} stale frames ({reason})")
+        for frame_path in stale_frames:
+            os.remove(frame_path)
+
+    stat = r3d_path.stat()
+    expected_frames = probe_total_frames(r3d_path)
+    manifest.update(basename, r3d_path=str(r3d_path), size=stat.st_size, mtime=stat.st_mtime, args=redline_args,
+                    expected_frames=expected_frames, produced_frames=0, renamed_offset=None, status="running")
+
+    log(tag, f"Processing: {r3d_path.name}")
+    log(tag, "Command: " + " ".join(cmd))
+
+    t0 = time.perf_counter()
     try:
-        subprocess.run(cmd, check=True)
-        print(f"Done: {basename}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error processing {r3d_path.name}: {e}")
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    except OSError as e:
+        log(tag, f"Error processing {r3d_path.name}: {e}")
+        manifest.update(basename, status="failed")
+        return stats
+
+    progress = {"expected_frames": expected_frames}
+    stop_event = threading.Event()
+    monitor = threading.Thread(target=monitor_progress, daemon=True,
+                               args=(tag, out_dir, progress, stop_event, args.progress_interval))
+    monitor.start()
+
+    # 逐行转发 REDline 输出（text 模式下 \r 进度行也会被拆成单独的行），进度行只更新总帧数
+    for line in proc.stdout:
+        line = line.strip()
+        if not line:
+            continue
+        match = PROGRESS_RE.fullmatch(line)
+        if match:
+            progress["expected_frames"] = progress["expected_frames"] or int(match.group(2))
+        else:
+            log(tag, line)
+    proc.wait()
+    stop_event.set()
+    monitor.join()
+
+    # --printMeta 没读到总帧数时，用进度行报告的总帧数做完整性检查，并记入清单
+    expected_frames = progress["expected_frames"]
+    produced_frames, nbytes = dir_size(out_dir)
+    wall_s = time.perf_counter() - t0
+    stats.update(frames=produced_frames, expected_frames=expected_frames, bytes=nbytes,
+                 wall_s=round(wall_s, 3), fps=round(produced_frames / wall_s, 3) if wall_s > 0 else 0.0)
+    if proc.returncode != 0:
+        log(tag, f"Error processing {r3d_path.name}: exit code {proc.returncode}")
+        manifest.update(basename, expected_frames=expected_frames, produced_frames=produced_frames, status="failed")
+        return stats
+    if expected_frames is not None and produced_frames < expected_frames:
+        log(tag, f"Error processing {r3d_path.name}: {produced_frames}/{expected_frames} frames written")
+        manifest.update(basename, expected_frames=expected_frames, produced_frames=produced_frames, status="failed")
+        return stats
+    manifest.update(basename, expected_frames=expected_frames, produced_frames=produced_frames, status="done")
+    stats["status"] = "done"
+    log(tag, f"Done: {basename} ({produced_frames} frames, {stats['fps']:.2f} fps, "
+             f"{nbytes / 1024 ** 3:.2f} GB, {wall_s / 60:.1f} min)")
+    return stats
 
 
 # def sort_files(r3d_files):
@@ -73,26 +319,92 @@ def process_r3d_file(r3d_path: Path, output_dir, ISO, is_flip=False):
 #     return sorted_idx
 
 
-def batch_process(input_dir, output_dir, ISO, is_flip=False):
-    """批量处理输入文件夹中的所有 R3D 文件"""
+def collect_r3d_jobs(input_dir, output_dir, ISO, is_flip=False):
+    """收集输入文件夹下所有 .RDC 中的 R3D 文件，返回转换任务列表"""
     input_dir = Path(input_dir)
     if not input_dir.exists():
         raise FileNotFoundError(f"Input path doesn't exist: {input_dir}")
     video_folders = sorted(input_dir.glob("*.RDC"))
     if not video_folders:
         print("No .RDC file found.")
-        return
+        return []
+
+    r3d_jobs = []
     for video_folder in video_folders:
         video_path = Path(video_folder)
         r3d_files = sorted(video_path.glob("*.R3D"))
         if not r3d_files:
-            print("No .R3D file found.")
-            return
-
-        print(f"Find {len(r3d_files)} R3D Files")
+            print(f"No .R3D file found in {video_path}.")
+            continue
+        # 同一段素材会被相机切分为 _001、_002 ... 多个 R3D，REDline 从第一段即可读出整段，
+        # 按去掉分段号后的名字（即输出目录名）去重，每段素材只转换一次
+        clips = {}
         for f in r3d_files:
-            process_r3d_file(f, output_dir, ISO, is_flip)
-            break
+            clips.setdefault("_".join(f.stem.split("_")[:-1]), f)
+        for f in clips.values():
+            r3d_jobs.append(dict(r3d_path=f, output_dir=output_dir, ISO=ISO, is_flip=is_flip))
+    return r3d_jobs
+
+
+def write_summary(results, summary_dir, wall_s, jobs, decode_threads):
+    """把每个任务的统计信息写成 CSV 和 JSON，文件名带时间戳"""
+    os.makedirs(summary_dir, exist_ok=True)
+    stem = os.path.join(summary_dir, "redline_summary_" + datetime.now().strftime("%Y%m%d_%H%M%S"))
+    with open(stem + ".csv", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+    converted = [r for r in results if r["status"] == "done"]
+    total_frames = sum(r["frames"] for r in converted)
+    summary = {"jobs": jobs,
+               "decode_threads": decode_threads,
+               "wall_s": round(wall_s, 3),
+               "frames": total_frames,
+               "bytes": sum(r["bytes"] for r in converted),
+               "fps": round(total_frames / wall_s, 3) if wall_s > 0 else 0.0,
+               "clips": results}
+    with open(stem + ".json", 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Converted {total_frames} frames in {wall_s / 60:.1f} min ({summary['fps']:.2f} fps overall)")
+    print(f"Summary saved to {stem}.csv / .json")
+
+
+def run_jobs(r3d_jobs, jobs=None, decode_threads=None, summary_dir=None):
+    """有限并发地运行多个 REDline 进程，结束后写出统计汇总，返回失败的 R3D 文件列表"""
+    if not r3d_jobs:
+        return []
+    jobs, decode_threads = plan_concurrency(jobs, decode_threads, len(r3d_jobs))
+    print(f"Find {len(r3d_jobs)} R3D clips, running {jobs} jobs x {decode_threads} decode threads")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process_r3d_file, decode_threads=decode_threads, **job) for job in r3d_jobs]
+        results = []
+        for job, future in zip(r3d_jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # 单个任务出错（如 stat、删除旧帧时的 OSError）只记为失败，其余任务照常完成并写出汇总
+                r3d_path = Path(job["r3d_path"])
+                log(r3d_path.stem, f"Error processing {r3d_path.name}: {e}")
+                results.append(failed_stats(r3d_path, decode_threads))
+    wall_s = time.perf_counter() - t0
+
+    failed = [job["r3d_path"] for job, stats in zip(r3d_jobs, results) if stats["status"] == "failed"]
+    print(f"Finished {len(r3d_jobs) - len(failed)}/{len(r3d_jobs)} R3D clips")
+    for f in failed:
+        print(f"Failed: {f}")
+
+    # 汇总默认写到所有输出根目录的公共父目录
+    summary_dir = summary_dir or os.path.commonpath([os.path.abspath(job["output_dir"]) for job in r3d_jobs])
+    write_summary(results, summary_dir, wall_s, jobs, decode_threads)
+    return failed
+
+
+def batch_process(input_dir, output_dir, ISO, is_flip=False, jobs=None, decode_threads=None):
+    """批量处理输入文件夹中的所有 R3D 文件"""
+    return run_jobs(collect_r3d_jobs(input_dir, output_dir, ISO, is_flip), jobs, decode_threads)
 
 
 def single_process():
@@ -127,6 +439,22 @@ def rename_lists(name_lists:list, offset):
         old_path.rename(new_path)
 
 
+def rename_clip(output_dir, video_dir, offset):
+    """
+    按偏移重命名单个素材的帧，并在转换清单中记录 renamed_offset：
+    续跑转换时据此核对帧数，重复运行第 2 步时跳过已重命名的素材（否则会再丢掉 offset 帧）
+    """
+    manifest = get_manifest(output_dir)
+    name = os.path.basename(video_dir)
+    entry = manifest.get(name)
+    if entry.get("renamed_offset") is not None:
+        print(f"Already renamed with offset {entry['renamed_offset']}: {video_dir}")
+        return
+    rename_lists(glob(os.path.join(video_dir, "*.tif")), offset)
+    if entry:
+        manifest.update(name, renamed_offset=offset)
+
+
 def get_subdirectories_walk(root_dir):
     subdirs = []
 
@@ -155,13 +483,24 @@ def frms_post_processing(normal_dir, low_dir, offset_file_path):
     offsets = []
     for line in offset_lines[1:]:
         offset = line.strip().split("\t")
-        offsets.append([int(x) for x in offset])
+        # Frames_offset.compute_offset 对缺少 Abs TC 的素材写 "-"，占位保持行号与素材顺序对应
+        if "-" in offset:
+            offsets.append(None)
+            continue
+        offset = [int(x) for x in offset]
+        # Frames_offset.compute_offset 输出两列（Normal_offset, Low_offset），没有视频序号列
+        if len(offset) == 2:
+            offset = [len(offsets) + 1] + offset
+        offsets.append(offset)
 
     normal_videos = get_subdirectories_walk(normal_dir)
     normal_videos.sort()
     low_videos = get_subdirectories_walk(low_dir)
     low_videos.sort()
     for idx in range(len(offsets)):
+        if offsets[idx] is None:
+            print(f"Skipping clip {idx + 1}: Abs TC missing")
+            continue
         video_idx, normal_offset, low_offset = offsets[idx]
         # save_path = os.path.join(save_dir, str(normal_dir)[-3:]+"_"+str(idx+1).zfill(3))
         # print(save_path)
@@ -173,14 +512,12 @@ def frms_post_processing(normal_dir, low_dir, offset_file_path):
 
         normal_video_dir = normal_videos[idx]
         print(f"Processing: {normal_video_dir}")
-        normal_img_lists = glob(os.path.join(normal_video_dir, "*.tif"))
-        rename_lists(normal_img_lists, normal_offset)
+        rename_clip(normal_dir, normal_video_dir, normal_offset)
 
 
         low_video_dir = low_videos[idx]
         print(f"Processing: {low_video_dir}")
-        low_img_lists = glob(os.path.join(low_video_dir, "*.tif"))
-        rename_lists(low_img_lists, low_offset)
+        rename_clip(low_dir, low_video_dir, low_offset)
 
 
 if __name__ == "__main__":
@@ -188,11 +525,13 @@ if __name__ == "__main__":
     # ISO = 12800 # 800 for normal light, 12800 for low light
     low_input_dir = r"/data2/B003"
     low_output_dir = r"/data1/Dataset/Esprit/Video_frames/Low_light"
-    batch_process(low_input_dir, low_output_dir, 12800, is_flip=True)
-
     normal_input_dir = r"/data2/A003"
     normal_output_dir = r"/data1/Dataset/Esprit/Video_frames/Normal_light"
-    batch_process(low_input_dir, low_output_dir, 800, is_flip=False)
+
+    # 两台机位的 R3D 放进同一个任务队列，整批共享并发上限
+    r3d_jobs = collect_r3d_jobs(low_input_dir, low_output_dir, 12800, is_flip=True)
+    r3d_jobs += collect_r3d_jobs(normal_input_dir, normal_output_dir, 800, is_flip=False)
+    run_jobs(r3d_jobs, args.jobs, args.decode_threads)
 
     """Step 2 Rename img"""
     # data_dir = Path(r"/data1/Dataset/Esprit/Video_frames")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+REDline orchestration benchmark:
+Builds fake A003 (normal light) / B003 (low light) card sets whose clips
+have known timecode offsets, then runs the conversion scheduler, the
+Abs TC / offset extraction and the frame renaming end to end with
+fake_redline.py standing in for REDline. Reports wall time per stage.
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import REDline
+import Frames_offset
+
+FAKE_REDLINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_redline.py")
+
+
+def frames_to_tc(frames, fps):
+    """帧数 -> HH:MM:SS:FF"""
+    ff = frames % fps
+    ss = frames // fps
+    return f"{ss // 3600:02d}:{ss // 60 % 60:02d}:{ss % 60:02d}:{ff:02d}"
+
+
+def make_fake_cards(root, num_clips, num_frames, fps, rng):
+    """
+    生成假素材卡：每段素材一个 .RDC 目录，内含 JSON 格式的假 R3D（记录帧数和 Abs TC）
+    低光机位随机晚开或早开几帧，返回真实的 (Normal_offset, Low_offset) 列表
+    """
+    normal_card, low_card = root / "A003", root / "B003"
+    offsets = []
+    for clip_idx in range(1, num_clips + 1):
+        # 每段素材间隔一分钟开机，保证 compute_offset 只用到 MM:SS:FF
+        start = 10 * 3600 * fps + clip_idx * 60 * fps
+        delay = int(rng.integers(-10, 11))
+        offsets.append((max(delay, 0), max(-delay, 0)))
+
+        for card, cam, tc in ((normal_card, "A003", start), (low_card, "B003", start + delay)):
+            clip_name = f"{cam}_C{clip_idx:03d}_0101AB"
+            clip_dir = card / f"{clip_name}.RDC"
+            clip_dir.mkdir(parents=True, exist_ok=True)
+            with open(clip_dir / f"{clip_name}_001.R3D", 'w') as f:
+                json.dump({"frames": num_frames, "abs_tc": frames_to_tc(tc, fps), "record_fps": fps}, f)
+    return normal_card, low_card, offsets
+
+
+def count_frames(root):
+    return sum(len(REDline.list_frames(d)) for d in REDline.get_subdirectories_walk(root))
+
+
+def bench_schedule(normal_card, low_card, out_root, jobs, decode_threads):
+    """阶段 1：并发转换两台机位的全部素材，再重跑一次测量清单跳过的开销"""
+    normal_out, low_out = out_root / "Normal_light", out_root / "Low_light"
+    r3d_jobs = REDline.collect_r3d_jobs(low_card, low_out, 12800, is_flip=True)
+    r3d_jobs += REDline.collect_r3d_jobs(normal_card, normal_out, 800, is_flip=False)
+
+    t0 = time.perf_counter()
+    REDline.run_jobs(r3d_jobs, jobs, decode_threads)
+    convert_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    REDline.run_jobs(r3d_jobs, jobs, decode_threads)
+    resume_s = time.perf_counter() - t0
+    return normal_out, low_out, convert_s, resume_s
+
+
+def bench_offset(normal_card, low_card, work_dir):
+    """阶段 2：读取两台机位的 Abs TC 并计算帧偏移"""
+    t0 = time.perf_counter()
+    tc_files = []
+    for card in (normal_card, low_card):
+        Frames_offset.args.input_dir = str(card)
+        Frames_offset.args.out_dir = str(work_dir / card.name)
+        os.makedirs(Frames_offset.args.out_dir, exist_ok=True)
+        Frames_offset.batch_process()
+        tc_files.append(os.path.join(Frames_offset.args.out_dir, "Abs_TC.txt"))
+
+    Frames_offset.args.out_dir = str(work_dir)
+    Frames_offset.compute_offset(*tc_files)
+    return work_dir / "Offset_TC_004.txt", time.perf_counter() - t0
+
+
+def load_offsets(offset_path):
+    with open(offset_path, 'r') as f:
+        return [tuple(int(x) for x in line.split("\t")) for line in f.readlines()[1:]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("REDline orchestration benchmark")
+    parser.add_argument('--clips', type=int, default=8, help='clips per camera')
+    parser.add_argument('--frames', type=int, default=48, help='frames per clip')
+    parser.add_argument('--width', type=int, default=1024)
+    parser.add_argument('--height', type=int, default=540)
+    parser.add_argument('--decode_fps', type=float, default=0, help='fake decode speed per job, 0 = unlimited')
+    parser.add_argument('--meta_delay', type=float, default=0, help='fake --printMeta latency in seconds')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4], help='concurrency levels to compare')
+    parser.add_argument('--decode_threads', type=int, default=None)
+    parser.add_argument('--meta_jobs', type=int, default=16, help='concurrent --printMeta processes')
+    parser.add_argument('--fps', type=int, default=25, help='timecode frame rate')
+    parser.add_argument('--work_dir', type=str, default=None, help='default: a temporary directory')
+    parser.add_argument('--keep', action='store_true', help='keep generated cards and frames')
+    parser.add_argument('--seed', type=int, default=0)
+    bench_args = parser.parse_args()
+
+    work_dir = Path(bench_args.work_dir or tempfile.mkdtemp(prefix="bench_redline_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    # 两个脚本都改为调用假 REDline，帧尺寸和速度通过环境变量传给子进程
+    REDline.args.REDLINE_CMD = FAKE_REDLINE
+    REDline.args.progress_interval = 3600
+    Frames_offset.args.REDLINE_CMD = FAKE_REDLINE
+    Frames_offset.args.fps = bench_args.fps
+    Frames_offset.args.jobs = bench_args.meta_jobs
+    os.environ.update(FAKE_REDLINE_WIDTH=str(bench_args.width),
+                      FAKE_REDLINE_HEIGHT=str(bench_args.height),
+                      FAKE_REDLINE_FPS=str(bench_args.decode_fps),
+                      FAKE_REDLINE_META_DELAY=str(bench_args.meta_delay))
+
+    rng = np.random.default_rng(bench_args.seed)
+    normal_card, low_card, true_offsets = make_fake_cards(work_dir / "cards", bench_args.clips, bench_args.frames,
+                                                          bench_args.fps, rng)
+    total_frames = 2 * bench_args.clips * bench_args.frames
+
+    results = []
+    try:
+        for jobs in bench_args.jobs:
+            out_root = work_dir / f"frames_jobs{jobs}"
+            normal_out, low_out, convert_s, resume_s = bench_schedule(normal_card, low_card, out_root, jobs,
+                                                                      bench_args.decode_threads)
+            results.append((f"convert (jobs={jobs})", convert_s, count_frames(out_root)))
+            results.append((f"resume  (jobs={jobs})", resume_s, 0))
+
+        offset_path, offset_s = bench_offset(normal_card, low_card, work_dir)
+        results.append(("offset", offset_s, 0))
+        offsets = load_offsets(offset_path)
+        mismatched = sum(o != t for o, t in zip(offsets, true_offsets))
+
+        # 重命名会修改帧文件，只在最后一次转换的结果上运行
+        t0 = time.perf_counter()
+        REDline.frms_post_processing(normal_out, low_out, offset_path)
+        results.append(("rename", time.perf_counter() - t0, count_frames(out_root)))
+
+        print(f"\n{total_frames} frames ({bench_args.clips} clips x 2 cameras x {bench_args.frames} frames, "
+              f"{bench_args.width}x{bench_args.height})")
+        print(f"{'stage':<20}{'wall(s)':>10}{'frames':>10}{'fps':>10}")
+        for stage, wall_s, frames in results:
+            fps = f"{frames / wall_s:.1f}" if frames else "-"
+            print(f"{stage:<20}{wall_s:>10.2f}{frames:>10}{fps:>10}")
+        print(f"Offsets matching ground truth: {len(offsets) - mismatched}/{len(true_offsets)}")
+    finally:
+        if not bench_args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f"Kept outputs in {work_dir}")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Fake REDline:
+A local stand-in for the REDline command line tool, for testing and
+benchmarking REDline.py / Frames_offset.py without the proprietary binary
+or R3D media. Select it with --REDLINE_CMD path/to/fake_redline.py.
+
+Supported arguments (everything else is accepted and ignored):
+  --i <clip.R3D> --outDir <dir> --resizeX <w> --resizeY <h>
+  --forceFlipHorizontal <0|1> --printMeta <n>
+
+The input R3D may be a JSON file with per-clip settings, e.g.
+{"frames": 240, "abs_tc": "10:00:03:12"}; missing keys (or a non-JSON
+input) fall back to the environment:
+  FAKE_REDLINE_FRAMES      frames per clip (default 48)
+  FAKE_REDLINE_FPS         decode speed limit in frames/s, 0 = unlimited (default 0)
+  FAKE_REDLINE_TC          Abs TC of the first frame (default 10:00:00:00)
+  FAKE_REDLINE_META_DELAY  seconds spent before printing metadata (default 0)
+  FAKE_REDLINE_WIDTH / FAKE_REDLINE_HEIGHT  override --resizeX / --resizeY
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+from pathlib import Path
+
+
+def load_clip_config(r3d_path):
+    """读取单个假 R3D 的配置，未提供的项用环境变量默认值"""
+    config = {"frames": int(os.environ.get("FAKE_REDLINE_FRAMES", 48)),
+              "abs_tc": os.environ.get("FAKE_REDLINE_TC", "10:00:00:00"),
+              "record_fps": 25}
+    try:
+        with open(r3d_path, 'r') as f:
+            config.update(json.load(f))
+    except (OSError, UnicodeDecodeError, json.JSONDecodeError):
+        pass
+    return config
+
+
+def print_meta(r3d_path, config, width, height):
+    """模仿 REDline --printMeta 的输出格式"""
+    time.sleep(float(os.environ.get("FAKE_REDLINE_META_DELAY", 0)))
+    clip_name = Path(r3d_path).stem
+    lines = [
+        f"File Name: {Path(r3d_path).name}",
+        f"Clip Name: {clip_name}",
+        "Camera Model: RED V-RAPTOR 8K VV",
+        f"Frame Width: {width * 2}",
+        f"Frame Height: {height * 2}",
+        f"Record FPS: {config['record_fps']:.3f}",
+        f"Total Frames: {config['frames']}",
+        f"Abs TC: {config['abs_tc']}",
+        "Edge TC: 01:00:00:00",
+        "ISO: 800",
+        "Kelvin: 5600",
+    ]
+    for line in lines:
+        print(line, flush=True)
+
+
+def write_frames(r3d_path, out_dir, config, width, height, is_flip):
+    """生成 <素材名>.<帧号:06d>.tif 序列，按 FAKE_REDLINE_FPS 限速"""
+    # 只在生成帧时导入，--printMeta 调用保持轻量
+    import cv2
+    import numpy as np
+
+    fps = float(os.environ.get("FAKE_REDLINE_FPS", 0))
+    clip_name = "_".join(Path(r3d_path).stem.split("_")[:-1]) or Path(r3d_path).stem
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 每帧在同一张底图上写帧号，避免逐帧生成整幅随机图
+    rng = np.random.default_rng(zlib.crc32(clip_name.encode()))
+    base = cv2.resize(rng.integers(0, 256, (height // 16 + 1, width // 16 + 1, 3), dtype=np.uint8), (width, height))
+    t0 = time.perf_counter()
+    for idx in range(config["frames"]):
+        frame = base.copy()
+        cv2.putText(frame, f"{clip_name} {idx}", (width // 10, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                    max(1.0, width / 800), (255, 255, 255), 3)
+        if is_flip:
+            frame = frame[:, ::-1]
+        frame_path = os.path.join(out_dir, f"{clip_name}.{idx:06d}.tif")
+        if not cv2.imwrite(frame_path, frame, [cv2.IMWRITE_TIFF_COMPRESSION, 1]):
+            print(f"Failed to write {frame_path}", file=sys.stderr)
+            return 1
+        print(f"Processed frame {idx + 1}/{config['frames']}", flush=True)
+
+        if fps > 0:
+            delay = t0 + (idx + 1) / fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser("fake REDline")
+    parser.add_argument('--i', type=str, required=True)
+    parser.add_argument('--outDir', type=str, default=None)
+    parser.add_argument('--resizeX', type=int, default=4096)
+    parser.add_argument('--resizeY', type=int, default=2160)
+    parser.add_argument('--forceFlipHorizontal', type=int, default=0)
+    parser.add_argument('--printMeta', type=int, default=0)
+    parser.add_argument('--useMeta', action='store_true')
+    args, _ = parser.parse_known_args()
+
+    if not os.path.exists(args.i):
+        print(f"Error: unable to open {args.i}", file=sys.stderr)
+        return 1
+
+    width = int(os.environ.get("FAKE_REDLINE_WIDTH", args.resizeX))
+    height = int(os.environ.get("FAKE_REDLINE_HEIGHT", args.resizeY))
+    config = load_clip_config(args.i)
+    if args.printMeta:
+        print_meta(args.i, config, width, height)
+        return 0
+    if args.outDir is None:
+        print("Error: --outDir is required", file=sys.stderr)
+        return 1
+    return write_frames(args.i, args.outDir, config, width, height, bool(args.forceFlipHorizontal))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+
+# 分块整帧变换使用的线程池（cv2 运算期间释放 GIL，多个条带可真正并行）
+_warp_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="warp")
+
+
+def translation(tx, ty):
+    """平移矩阵"""
+    return np.array([
+        [1, 0, tx],
+        [0, 1, ty],
+        [0, 0, 1]
+    ], dtype=np.float64)
+
+
+def union_rect(rect1, rect2):
+    """两个 [x0, y0, x1, y1] 区域的外接矩形"""
+    return [min(rect1[0], rect2[0]), min(rect1[1], rect2[1]),
+            max(rect1[2], rect2[2]), max(rect1[3], rect2[3])]
+
+
+def contains_rect(outer, inner):
+    """inner 是否完全位于 outer 内"""
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+            outer[2] >= inner[2] and outer[3] >= inner[3])
+
+
+def rect_area(rect):
+    return max(0, rect[2] - rect[0]) * max(0, rect[3] - rect[1])
+
+
+def warp_region(img, mtx, rect, out=None):
+    """
+    只计算透视变换结果中 rect = [x0, y0, x1, y1] 范围内的像素，
+    等价于 cv2.warpPerspective(img, mtx, (W, H))[y0:y1, x0:x1]，耗时与区域大小成正比
+    """
+    x0, y0, x1, y1 = rect
+    mtx_region = translation(-x0, -y0) @ mtx
+    if out is None:
+        return cv2.warpPerspective(img, mtx_region, (x1 - x0, y1 - y0))
+    cv2.warpPerspective(img, mtx_region, (x1 - x0, y1 - y0), dst=out)
+    return out
+
+
+def warp_perspective_tiled(img, mtx, dsize, out=None, tile_rows=256):
+    """
+    整帧透视变换：输出按行切成条带，在线程池中并行计算并直接写入 out，
+    结果与 cv2.warpPerspective(img, mtx, dsize) 一致
+    """
+    w, h = dsize
+    if out is None or out.shape[:2] != (h, w) or out.dtype != img.dtype:
+        out = np.empty((h, w) + img.shape[2:], dtype=img.dtype)
+
+    futures = [_warp_executor.submit(warp_region, img, mtx, [0, y, w, min(y + tile_rows, h)],
+                                     out[y:min(y + tile_rows, h)])
+               for y in range(0, h, tile_rows)]
+    for future in futures:
+        future.result()
+    return out